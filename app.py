@@ -1,15 +1,21 @@
 import pandas as pd
 import streamlit as st
 import io
-import re
-from datetime import datetime, timedelta
-import numpy as np
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Border, Side, Alignment, Font
-from openpyxl.utils import get_column_letter
 import hashlib
 import os
-import base64
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from jobs import MAX_CONCURRENT_JOBS, MEMORY_BUDGET_MB, PROGRESS_STAGES, STREAMING_PROGRESS_STAGES, JobRunner
+from pointage import (
+    CHUNK_SIZE, InputFilter, InputFormatError, MemoryBudgetError, SpooledOutput, append_diagnostics_log, format_summary,
+    load_schedules, run_pipeline
+)
+from result_store import DEFAULT_STORE_PATH, ResultStore
+from review import DEFAULT_PAGE_SIZE, SORT_COLUMNS, ReviewIndex
 
 # Configuration de la page
 st.set_page_config(page_title="Processeur de Données de Pointage", layout="wide")
@@ -57,462 +63,175 @@ if not st.session_state.authenticated:
     # Arrêter l'exécution si non authentifié
     st.stop()
 
-# Fonction pour normaliser les données de pointage avec 5 valeurs
-def normalize_pointage(pointages):
+# Taille maximale (en octets, mémoire et fichiers temporaires) du cache des résultats partagé entre les sessions
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Journal JSON (une ligne par traitement) des mesures de performance par étape
+DIAGNOSTICS_LOG_PATH = os.environ.get('POINTAGE_DIAGNOSTICS', 'pointage_diagnostics.jsonl')
+
+# Cache des résultats de traitement, indexé par empreinte du fichier et des paramètres
+class ResultCache:
     """
-    Normaliser les données de pointage avec 5 valeurs au format standard de 4 valeurs.
-    
-    Args:
-        pointages: Liste de chaînes d'heure au format "HH:MM"
+    Cache LRU borné en taille des résultats de run_pipeline.
     
-    Returns:
-        Liste de 4 chaînes d'heure représentant [entrée, début_pause, fin_pause, sortie]
+    Les entrées les moins récemment utilisées sont évincées dès que la taille estimée
+    totale dépasse max_bytes, fichiers produits passés sur disque compris: ceux-ci sont
+    supprimés lorsque plus aucune session ne détient le résultat évincé. Le cache est
+    partagé entre les sessions Streamlit, d'où le verrou.
     """
-    if len(pointages) == 4:
-        return pointages  # Déjà au format correct
-    
-    if len(pointages) != 5:
-        return pointages  # Ne peut pas gérer d'autres formats, retourner tel quel
-    
-    # Convertir toutes les heures en objets datetime pour une comparaison plus facile
-    times = [datetime.strptime(t, "%H:%M") for t in pointages]
-    
-    # Limites de l'horaire de travail
-    morning_start = datetime.strptime("09:00", "%H:%M")
-    lunch_start = datetime.strptime("13:00", "%H:%M")
-    lunch_end = datetime.strptime("15:00", "%H:%M")
-    day_end = datetime.strptime("18:00", "%H:%M")
-    
-    # Cas 1: Vérifier les pointages en double (heures qui sont à moins de 5 minutes l'une de l'autre)
-    for i in range(len(times) - 1):
-        time_diff = abs((times[i+1] - times[i]).total_seconds() / 60)
-        if time_diff <= 5:  # Dans les 5 minutes
-            # Supprimer le doublon (garder le premier)
-            del times[i+1]
-            return [t.strftime("%H:%M") for t in times]
-    
-    # Cas 2: Vérifier les pointages multiples de pause
-    # Identifier quelles heures tombent dans la période de pause (13:00-15:00)
-    break_times = []
-    for i, t in enumerate(times):
-        if lunch_start <= t <= lunch_end:
-            break_times.append((i, t))
-    
-    # Si nous avons 3 heures de pause, nous devons déterminer lesquelles garder
-    if len(break_times) == 3:
-        # Stratégie: Garder les première et dernière heures de pause
-        # Cela suppose que l'employé a pointé pour la pause, puis a pointé à nouveau pendant la pause
-        middle_idx = break_times[1][0]
-        del times[middle_idx]
-        return [t.strftime("%H:%M") for t in times]
-    
-    # Cas 3: S'il y a plus d'une entrée matinale ou sortie du soir
-    morning_entries = []
-    evening_exits = []
     
-    for i, t in enumerate(times):
-        if t < lunch_start:
-            morning_entries.append((i, t))
-        elif t > lunch_end:
-            evening_exits.append((i, t))
-    
-    # S'il y a plusieurs entrées matinales, garder celle qui est la plus proche de 9:00
-    if len(morning_entries) > 1:
-        # Trier par différence absolue par rapport à 9:00
-        morning_entries.sort(key=lambda x: abs((x[1] - morning_start).total_seconds()))
-        # Garder toutes sauf la première (la plus proche de 9:00)
-        for i, _ in morning_entries[1:]:
-            # Ajuster l'index pour les suppressions précédentes
-            del times[i - morning_entries[1:].index((i, _))]
-        return [t.strftime("%H:%M") for t in times]
-    
-    # S'il y a plusieurs sorties du soir, garder celle qui est la plus proche de 18:00
-    if len(evening_exits) > 1:
-        # Trier par différence absolue par rapport à 18:00
-        evening_exits.sort(key=lambda x: abs((x[1] - day_end).total_seconds()))
-        # Garder toutes sauf la première (la plus proche de 18:00)
-        for i, _ in evening_exits[1:]:
-            # Ajuster l'index pour les suppressions précédentes
-            del times[i - evening_exits[1:].index((i, _))]
-        return [t.strftime("%H:%M") for t in times]
-    
-    # Si nous avons toujours 5 valeurs, utiliser une stratégie de repli:
-    # Garder la première entrée, la première sortie de pause, la dernière entrée de pause et la dernière sortie
-    if len(times) == 5:
-        # Supposer que les heures sont plus ou moins dans l'ordre: entrée, sortie pause, [heure supplémentaire], entrée pause, sortie
-        del times[2]  # Supprimer la valeur du milieu
-    
-    return [t.strftime("%H:%M") for t in times]
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+    
+    def put(self, key, result):
+        size = estimate_result_size(result)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            # Un résultat plus grand que le cache entier n'est pas conservé
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (result, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+    
+    def __len__(self):
+        return len(self._entries)
 
-# Fonction pour analyser le fichier CSV d'entrée
-def parse_input_csv(file):
-    # Lire le fichier CSV
-    df = pd.read_csv(file, delimiter=';', encoding='utf-8', dtype=str)  # Forcer toutes les colonnes à être des chaînes
-    
-    # Vérifier si le CSV a des en-têtes ou non
-    if len(df.columns) == 1:
-        # S'il n'y a qu'une seule colonne, le fichier n'a pas d'en-têtes appropriés
-        # Diviser la colonne unique en plusieurs colonnes
-        df = pd.DataFrame([x.split(';') for x in df.iloc[:, 0].values.tolist()])
-        # En supposant que les colonnes sont: Matricule, Nom, Départment, Date, Pointages
-        if len(df.columns) >= 5:
-            df.columns = ['Matricule', 'Nom', 'Départment', 'Date', 'Pointages'] + [f'Extra{i}' for i in range(len(df.columns) - 5)]
-        else:
-            # Gérer le cas où il y a moins de colonnes que prévu
-            st.error(f"Erreur de format CSV: Au moins 5 colonnes attendues, {len(df.columns)} trouvées")
-            return None
-    
-    # S'assurer que toutes les colonnes sont des chaînes
-    for col in df.columns:
-        df[col] = df[col].astype(str)
-    
-    # Nettoyer la colonne Pointages - remplacer NaN par une chaîne vide
-    df['Pointages'] = df['Pointages'].fillna('').astype(str)
-    df['Pointages'] = df['Pointages'].replace('nan', '')
-    
-    return df
+# Fonction pour estimer la taille d'un résultat de traitement (mémoire et fichiers temporaires)
+def estimate_result_size(result):
+    size = 0
+    for value in result.values():
+        if isinstance(value, pd.DataFrame):
+            size += int(value.memory_usage(deep=True).sum())
+        elif isinstance(value, (bytes, bytearray)):
+            size += len(value)
+        elif isinstance(value, SpooledOutput):
+            # Un fichier passé sur disque compte aussi: il n'est supprimé qu'avec le résultat évincé
+            size += len(value)
+        elif isinstance(value, dict):
+            size += estimate_result_size(value)
+    return size
 
-# Fonction pour traiter les entrées de temps
-def process_time_entries(df):
-    results = []
-    
-    for _, row in df.iterrows():
-        matricule = row['Matricule']
-        nom = row['Nom']
-        departement = row['Départment']
-        date_str = row['Date']
-        pointages_str = row['Pointages']
-        
-        # Ignorer les lignes avec des pointages vides ou invalides
-        if pd.isna(pointages_str) or pointages_str == 'nan' or pointages_str == '':
-            pointages_str = ''
-        
-        # Analyser la date
-        try:
-            date = datetime.strptime(date_str, '%d/%m/%Y')
-        except:
-            # Ignorer les dates invalides
-            continue
-        
-        # Analyser les pointages
-        try:
-            pointages = pointages_str.split() if pointages_str else []
-            
-            # Indicateur pour les pointages à 5 valeurs
-            original_pointage = ' '.join(pointages)
-            has_five_values = len(pointages) == 5
-            
-            # Gérer les pointages à 5 valeurs
-            if len(pointages) == 5:
-                pointages = normalize_pointage(pointages)
-                
-        except AttributeError:
-            # Gérer le cas où pointages_str n'est pas une chaîne
-            pointages = []
-            has_five_values = False
-            original_pointage = str(pointages_str)
-        
-        # Valeurs par défaut
-        entree = ""
-        sortie = ""
-        debut_pause = ""
-        fin_pause = ""
-        temps_pause = "00:00"
-        h_p = "01:00"  # Temps de pause par défaut
-        h_tr = ""
-        h_l = "08:00"  # Heures de travail par défaut
-        heures_perdues = ""
-        heures_supp = ""
-        observations = ""
-        
-        # Définir les observations pour les pointages à 5 valeurs
-        if has_five_values:
-            observations = f"À VÉRIFIER: Original avait 5 valeurs: {original_pointage}"
-        
-        if len(pointages) == 4:
-            # Données complètes: entrée, sortie pause, entrée pause, sortie
-            entree = pointages[0]
-            debut_pause = pointages[1]
-            fin_pause = pointages[2]
-            sortie = pointages[3]
-            
-            # Calculer le temps de pause
-            try:
-                t1 = datetime.strptime(debut_pause, '%H:%M')
-                t2 = datetime.strptime(fin_pause, '%H:%M')
-                pause_delta = (t2 - t1) if t2 > t1 else (t2 - t1 + timedelta(days=1))
-                pause_hours = pause_delta.seconds // 3600
-                pause_minutes = (pause_delta.seconds % 3600) // 60
-                temps_pause = f"{pause_hours:02d}:{pause_minutes:02d}"
-                
-                # Calculer les heures de travail
-                t_entry = datetime.strptime(entree, '%H:%M')
-                t_exit = datetime.strptime(sortie, '%H:%M')
-                work_delta = (t_exit - t_entry) if t_exit > t_entry else (t_exit - t_entry + timedelta(days=1))
-                work_delta = work_delta - pause_delta  # Soustraire le temps de pause
-                work_hours = work_delta.seconds // 3600
-                work_minutes = (work_delta.seconds % 3600) // 60
-                h_tr = f"{work_hours:02d}:{work_minutes:02d}"
-                
-                # Calculer s'il y a des heures perdues
-                standard_hours = datetime.strptime(h_l, '%H:%M')
-                actual_hours = datetime.strptime(h_tr, '%H:%M')
-                
-                if actual_hours < standard_hours:
-                    diff = standard_hours - actual_hours
-                    lost_hours = diff.seconds // 3600
-                    lost_minutes = (diff.seconds % 3600) // 60
-                    heures_perdues = f"{lost_hours:02d}:{lost_minutes:02d}"
-                elif actual_hours > standard_hours:
-                    diff = actual_hours - standard_hours
-                    extra_hours = diff.seconds // 3600
-                    extra_minutes = (diff.seconds % 3600) // 60
-                    heures_supp = f"{extra_hours:02d}:{extra_minutes:02d}"
-            except Exception as e:
-                if observations:
-                    observations += " | Erreur dans les calculs de temps"
-                else:
-                    observations = "Erreur dans les calculs de temps"
-                
-        elif len(pointages) == 2:
-            # Seulement les heures d'entrée et de sortie
-            entree = pointages[0]
-            sortie = pointages[1]
-            if observations:
-                observations += " | Données de pause manquantes"
-            else:
-                observations = "Données de pause manquantes"
-            
-            # Calculer les heures de travail sans pause
-            try:
-                t_entry = datetime.strptime(entree, '%H:%M')
-                t_exit = datetime.strptime(sortie, '%H:%M')
-                work_delta = (t_exit - t_entry) if t_exit > t_entry else (t_exit - t_entry + timedelta(days=1))
-                # Supposer une pause standard
-                pause_delta = datetime.strptime(h_p, '%H:%M') - datetime.strptime("00:00", '%H:%M')
-                work_delta = work_delta - pause_delta
-                work_hours = work_delta.seconds // 3600
-                work_minutes = (work_delta.seconds % 3600) // 60
-                h_tr = f"{work_hours:02d}:{work_minutes:02d}"
-                
-                # Calculer s'il y a des heures perdues
-                standard_hours = datetime.strptime(h_l, '%H:%M')
-                actual_hours = datetime.strptime(h_tr, '%H:%M')
-                
-                if actual_hours < standard_hours:
-                    diff = standard_hours - actual_hours
-                    lost_hours = diff.seconds // 3600
-                    lost_minutes = (diff.seconds % 3600) // 60
-                    heures_perdues = f"{lost_hours:02d}:{lost_minutes:02d}"
-                elif actual_hours > standard_hours:
-                    diff = actual_hours - standard_hours
-                    extra_hours = diff.seconds // 3600
-                    extra_minutes = (diff.seconds % 3600) // 60
-                    heures_supp = f"{extra_hours:02d}:{extra_minutes:02d}"
-            except Exception as e:
-                if observations:
-                    observations += " | Erreur dans les calculs de temps"
-                else:
-                    observations = "Erreur dans les calculs de temps"
-        elif len(pointages) == 0:
-            if observations:
-                observations += " | Absent"
-            else:
-                observations = "Absent"
-            entree = "00:00"
-            sortie = "00:00"
-            temps_pause = "00:00"
-            h_tr = "00:00"
-        else:
-            if observations:
-                observations += f" | Données irrégulières: {len(pointages)} valeurs"
-            else:
-                observations = f"Données irrégulières: {len(pointages)} valeurs"
-        
-        results.append({
-            'Matricule': matricule,
-            'Nom': nom,
-            'Départment': departement,
-            'Date': date_str,
-            'Entrée': entree,
-            'Sortie': sortie,
-            'Début Pause': debut_pause,
-            'Fin Pause': fin_pause,
-            'Temps de pause': temps_pause,
-            'H.P': h_p,
-            'H. Tr': h_tr,
-            'HL': h_l,
-            'Heures perdues': heures_perdues,
-            'Heures supp': heures_supp,
-            'Observations': observations
-        })
-    
-    return pd.DataFrame(results)
-
-# Fonction pour créer un fichier Excel stylisé
-def create_styled_excel(df, df_input, start_date, end_date):
-    # Créer un classeur et sélectionner la feuille de calcul active
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Etat de pointage"
-    
-    # Définir les styles
-    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-    subheader_fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")
-    recheck_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")  # Jaune clair pour vérification
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    center_alignment = Alignment(horizontal='center', vertical='center')
-    bold_font = Font(bold=True)
-    
-    # Ajouter la ligne de titre
-    ws.merge_cells('A1:N1')
-    title_cell = ws['A1']
-    title_cell.value = f"Du {start_date} AU {end_date}"
-    title_cell.alignment = center_alignment
-    title_cell.font = bold_font
-    
-    # Ajouter la ligne d'en-tête
-    headers = [
-        'Matricule', 'Prénom/Nom', 'Dept', 'Date', 'Entrée', 'Sortie', 
-        'Début Pause', 'Fin Pause', 'Temps de pause', 'H.P', 'H. Tr', 'HL',
-        'Heures perdues', 'Heures supp', 'Cumul HP', 'Cumul HS', 'TOTAL HP', 'Observations'
-    ]
-    
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col_idx)
-        cell.value = header
-        cell.fill = subheader_fill
-        cell.border = thin_border
-        cell.alignment = center_alignment
-        cell.font = bold_font
-    
-    # Ajouter les lignes de données
-    row_idx = 4
-    current_matricule = None
-    cumul_hp = timedelta()
-    cumul_hs = timedelta()
-    
-    for _, row in df.iterrows():
-        # Vérifier si nous commençons un nouvel employé
-        if current_matricule != row['Matricule']:
-            current_matricule = row['Matricule']
-            cumul_hp = timedelta()
-            cumul_hs = timedelta()
-        
-        # Ajouter les heures perdues au total cumulatif si présentes
-        if row['Heures perdues']:
-            try:
-                h, m = map(int, row['Heures perdues'].split(':'))
-                cumul_hp += timedelta(hours=h, minutes=m)
-            except:
-                pass
-        
-        # Ajouter les heures supplémentaires au total cumulatif si présentes
-        if row['Heures supp']:
-            try:
-                h, m = map(int, row['Heures supp'].split(':'))
-                cumul_hs += timedelta(hours=h, minutes=m)
-            except:
-                pass
-        
-        # Formater les heures cumulatives
-        cumul_hp_str = f"{cumul_hp.days * 24 + cumul_hp.seconds // 3600:02d}:{(cumul_hp.seconds % 3600) // 60:02d}"
-        cumul_hs_str = f"{cumul_hs.days * 24 + cumul_hs.seconds // 3600:02d}:{(cumul_hs.seconds % 3600) // 60:02d}"
-        
-        # Calculer le total HP (ce serait une décision de logique métier, pour l'instant juste montrer cumul_hp)
-        total_hp = cumul_hp_str
-        
-        # Ajouter les données de ligne
-        data = [
-            row['Matricule'], row['Nom'], row['Départment'], row['Date'],
-            row['Entrée'], row['Sortie'], row['Début Pause'], row['Fin Pause'],
-            row['Temps de pause'], row['H.P'], row['H. Tr'], row['HL'],
-            row['Heures perdues'], row['Heures supp'], cumul_hp_str, cumul_hs_str,
-            total_hp, row['Observations']
-        ]
-        
-        # Vérifier si cette ligne doit être mise en évidence pour vérification
-        needs_recheck = "À VÉRIFIER" in str(row['Observations'])
-        
-        for col_idx, value in enumerate(data, 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            cell.value = value
-            cell.border = thin_border
-            cell.alignment = center_alignment
-            
-            # Mettre en évidence toute la ligne si elle nécessite une vérification
-            if needs_recheck:
-                cell.fill = recheck_fill
-            
-            # Colorer la colonne H. Tr en rouge si elle est inférieure à HL
-            if col_idx == 11 and value:  # Colonne H. Tr
-                try:
-                    h_tr = datetime.strptime(value, '%H:%M')
-                    h_l = datetime.strptime(row['HL'], '%H:%M')
-                    if h_tr < h_l:
-                        cell.font = Font(color="FF0000")
-                except:
-                    pass
-            
-            # Colorer la colonne Heures perdues en rouge
-            if col_idx == 13 and value:  # Colonne Heures perdues
-                cell.font = Font(color="FF0000")
-        
-        row_idx += 1
-    
-    # Ajuster automatiquement les largeurs de colonne
-    for col_idx in range(1, len(headers) + 1):
-        col_letter = get_column_letter(col_idx)
-        ws.column_dimensions[col_letter].width = 15
-    
-    # Rendre la colonne Observations plus large
-    ws.column_dimensions[get_column_letter(len(headers))].width = 40
-    
-    # Créer une deuxième feuille pour les données originales
-    ws2 = wb.create_sheet(title="Données Originales")
-    
-    # Ajouter un titre à la deuxième feuille
-    ws2.merge_cells('A1:E1')
-    title_cell = ws2['A1']
-    title_cell.value = "Données d'Entrée Originales"
-    title_cell.alignment = center_alignment
-    title_cell.font = bold_font
-    
-    # Ajouter des en-têtes à la deuxième feuille
-    input_headers = list(df_input.columns)
-    
-    for col_idx, header in enumerate(input_headers, 1):
-        cell = ws2.cell(row=3, column=col_idx)
-        cell.value = header
-        cell.fill = header_fill
-        cell.border = thin_border
-        cell.alignment = center_alignment
-        cell.font = bold_font
-    
-    # Ajouter des lignes de données à la deuxième feuille
-    for row_idx, (_, row) in enumerate(df_input.iterrows(), 4):
-        for col_idx, col_name in enumerate(input_headers, 1):
-            cell = ws2.cell(row=row_idx, column=col_idx)
-            cell.value = row[col_name]
-            cell.border = thin_border
-            cell.alignment = center_alignment
-    
-    # Ajuster automatiquement les largeurs de colonne dans la deuxième feuille
-    for col_idx in range(1, len(input_headers) + 1):
-        col_letter = get_column_letter(col_idx)
-        ws2.column_dimensions[col_letter].width = 20
-    
-    # Créer une sortie en mémoire
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return output
+# Fonction pour calculer la clé de cache d'un fichier et de ses paramètres de traitement
+def result_cache_key(file_bytes, **settings):
+    digest = hashlib.sha256(file_bytes)
+    digest.update(repr(sorted(settings.items())).encode())
+    return digest.hexdigest()
+
+# Instance unique du cache, conservée entre les réexécutions du script
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(RESULT_CACHE_MAX_BYTES)
+
+# Historique local des résultats pour le traitement incrémental
+@st.cache_resource
+def get_result_store():
+    return ResultStore(DEFAULT_STORE_PATH)
+
+# Index de vérification du résultat affiché, construit une fois par résultat et par session
+def get_review_index(result):
+    if st.session_state.get('review_source') is not result:
+        st.session_state.review_source = result
+        st.session_state.review_index = ReviewIndex(result['recheck_entries'])
+    return st.session_state.review_index
+
+# Vue de vérification filtrée et paginée: seule la page affichée est envoyée au navigateur
+def show_review(index):
+    columns = st.columns(4)
+    departments = columns[0].multiselect("Départements", index.options('Départment'))
+    matricules = columns[1].multiselect("Matricules", index.options('Matricule'))
+    types = columns[2].multiselect("Types d'observation", index.options('Observations'))
+    first, last = index.date_bounds()
+    date_range = columns[3].date_input("Période", (first, last), min_value=first, max_value=last)
+    # Pendant la saisie de la période, une seule date est sélectionnée
+    if len(date_range) != 2:
+        date_range = (first, last)
+    
+    columns = st.columns(4)
+    sort_by = columns[0].selectbox("Trier par", SORT_COLUMNS)
+    ascending = columns[1].radio("Ordre", ["Croissant", "Décroissant"], horizontal=True) == "Croissant"
+    page_size = columns[2].selectbox("Lignes par page", [50, DEFAULT_PAGE_SIZE, 250, 500], index=1)
+    
+    positions = index.query(matricules, departments, date_range, types, sort_by, ascending)
+    page_count = max(1, -(-len(positions) // page_size))
+    page = columns[3].number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, value=1)
+    
+    st.caption(f"{len(positions)} lignes sélectionnées sur {len(index)}")
+    st.dataframe(index.page(positions, page, page_size), hide_index=True)
+    
+    # Synthèse des lignes sélectionnées par employé ou par département
+    by = st.radio("Synthèse par", ["Matricule", "Départment"], horizontal=True, format_func={'Matricule': "Employé", 'Départment': "Département"}.get)
+    st.dataframe(index.summary(by, positions), hide_index=True)
+
+# Exécution des traitements en arrière-plan, partagée entre les sessions
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(MAX_CONCURRENT_JOBS, MEMORY_BUDGET_MB)
+
+# Traitement exécuté en arrière-plan: calcul, mise en cache du résultat et journalisation des mesures
+def process_upload(file_bytes, file_name, settings, cache, store, schedule_bytes, incremental_mode, metrics, workers=1):
+    # Exécuté hors du script Streamlit: aucun appel à st.* ici
+    start = time.perf_counter()
+    log_entry = {
+        'horodatage': datetime.now().isoformat(timespec='seconds'),
+        'fichier': file_name,
+        'octets': len(file_bytes),
+        'parametres': dict(settings, incremental_mode=incremental_mode)
+    }
+    try:
+        schedules = load_schedules(io.BytesIO(schedule_bytes)) if schedule_bytes is not None else None
+        input_filter = InputFilter(**settings['filtre']) if 'filtre' in settings else None
+        result = run_pipeline(
+            io.BytesIO(file_bytes), settings['streaming_mode'], settings['conditional_formatting'], store,
+            columnar_output=True, metrics=metrics, split_by=settings['split_by'], workers=workers, schedules=schedules,
+            input_filter=input_filter, keep_frames=False
+        )
+        # En mode incrémental, le résultat est rangé sous l'état de l'historique après traitement
+        if store is not None:
+            settings = dict(settings, store_revision=store.revision())
+        cache.put(result_cache_key(file_bytes, **settings), result)
+        return result
+    except (InputFormatError, MemoryBudgetError) as e:
+        log_entry['erreur'] = str(e)
+        raise
+    except Exception as e:
+        log_entry['erreur'] = f"{type(e).__name__}: {str(e).strip()}"
+        raise
+    finally:
+        # Journaliser les mesures, y compris en cas d'échec (étapes déjà exécutées)
+        log_entry['secondes'] = round(time.perf_counter() - start, 4)
+        log_entry['memoire_traitement_mo'] = None if metrics.job_peak_mb is None else round(metrics.job_peak_mb, 1)
+        log_entry['etapes'] = metrics.summary()
+        append_diagnostics_log(DIAGNOSTICS_LOG_PATH, log_entry)
+
+# Fonction pour lire une liste de valeurs saisie (séparées par des virgules, points-virgules ou retours à la ligne)
+def parse_filter_values(text):
+    return [value.strip() for value in re.split(r'[,;\n]+', text) if value.strip()]
+
+# Progression d'un traitement en arrière-plan, actualisée chaque seconde sans réexécuter toute la page
+@st.fragment(run_every=1)
+def show_job_progress(job):
+    # Traitement terminé: réexécuter toute la page pour afficher le résultat
+    if job.done():
+        st.rerun()
+    fraction, text = job.progress()
+    st.progress(fraction, text=f"Traitement de {job.name} — {text}")
+    if job.started is None:
+        runner = get_job_runner()
+        st.caption(f"{runner.active_count()} traitements en cours ou en attente (au plus {runner.max_workers} simultanés).")
 
 # Interface utilisateur Streamlit
 st.title("Processeur de Données de Pointage")
@@ -522,62 +241,186 @@ Cette application traite les données de pointage et génère un rapport Excel s
 
 ### Format d'Entrée:
 - Fichier CSV avec colonnes: Matricule;Nom;Départment;Date;Pointages
-- Peut également gérer les pointages à 5 valeurs (avec des pointages en double ou supplémentaires)
+- Séparateur (; , tabulation), encodage (UTF-8, Windows-1252/Latin-1) et ligne d'en-tête détectés automatiquement
+- Ou un classeur Excel (.xlsx, .xls) avec les mêmes colonnes dans la première feuille
+- Ou un export Parquet produit par cette application (résultats relus sans nouveau calcul)
+- Peut également gérer les pointages irréguliers (3, 5 valeurs ou plus, avec des pointages en double ou supplémentaires)
 
 ### Sortie:
 - Fichier Excel stylisé avec calcul des heures de travail, pauses et totaux
-- Les lignes avec des pointages à 5 valeurs sont surlignées et marquées pour vérification
+- Les lignes dont les pointages ont été normalisés sont surlignées et marquées pour vérification
 - Les données d'entrée originales sont conservées dans une deuxième feuille
+- Option: un classeur par département ou par employé, regroupés dans une archive zip avec un index
+- Export Parquet typé des résultats (durées en minutes, dates réelles) pour la paie et la BI
+
+### Horaires de travail (optionnel):
+- Fichier CSV avec une ligne d'en-tête et des colonnes parmi: Matricule;Départment;Jour;Début;Début pause;Fin pause;Fin;HL;H.P
+- Une colonne de sélection vide s'applique à tous; une heure vide reprend l'horaire par défaut (09:00-18:00, pause 13:00-15:00, HL 08:00, H.P 01:00)
+- La règle la plus spécifique s'applique: Matricule, puis Départment, puis générale; à niveau égal, une règle par jour l'emporte
+
+### Filtres (optionnel):
+- Période, départements et matricules: seules les lignes retenues sont calculées et écrites dans le rapport
 """)
 
 # Téléchargeur de fichier
-uploaded_file = st.file_uploader("Télécharger votre fichier CSV de données de pointage", type=["csv", "xls", "xlsx"])
+uploaded_file = st.file_uploader("Télécharger votre fichier CSV de données de pointage", type=["csv", "xls", "xlsx", "parquet"])
+
+# Horaires de travail par département, employé et jour de la semaine (optionnel)
+schedule_file = st.file_uploader("Horaires de travail (optionnel)", type=["csv"])
+
+# Option de lecture par blocs pour les fichiers volumineux
+streaming_mode = st.checkbox(
+    "Mode streaming (fichiers volumineux)",
+    help=f"Lire et traiter le fichier par blocs de {CHUNK_SIZE} lignes pour limiter la mémoire utilisée."
+)
+
+# Option de mise en forme par règles conditionnelles plutôt que cellule par cellule
+conditional_formatting = st.checkbox(
+    "Mise en forme conditionnelle (rapport plus léger)",
+    help="Écrire les données sans style et appliquer la mise en évidence et les couleurs par des règles Excel."
+)
+
+# Option de traitement incrémental à partir de l'historique local (non disponible en mode streaming)
+incremental_mode = st.checkbox(
+    "Mode incrémental (historique local)",
+    disabled=streaming_mode,
+    help="Ne recalculer que les lignes nouvelles ou modifiées et reprendre les cumuls à partir des imports précédents."
+)
+incremental_mode = incremental_mode and not streaming_mode
+
+# Option de découpage du rapport en un classeur par département ou par employé (archive zip)
+SPLIT_OPTIONS = {None: "Un seul classeur", 'Départment': "Un classeur par département", 'Matricule': "Un classeur par employé"}
+split_by = st.selectbox(
+    "Découpage du rapport",
+    list(SPLIT_OPTIONS),
+    format_func=SPLIT_OPTIONS.get,
+    disabled=streaming_mode,
+    help="Produire des classeurs séparés, écrits en parallèle et regroupés dans une archive zip avec un index."
+)
+split_by = None if streaming_mode else split_by
+
+# Filtres appliqués à la lecture: les lignes écartées ne sont ni calculées ni écrites
+with st.expander("Filtres (optionnel)"):
+    columns = st.columns(3)
+    period = columns[0].date_input("Période", value=(), format="DD/MM/YYYY", help="Première et dernière date incluses (toutes les dates si vide).")
+    departments = parse_filter_values(columns[1].text_input("Départements", help="Séparés par des virgules (tous si vide)."))
+    matricules = parse_filter_values(columns[2].text_input("Matricules", help="Séparés par des virgules (tous si vide)."))
+input_filter_settings = {}
+# Pendant la saisie de la période, une seule date est sélectionnée
+if len(period) == 2:
+    input_filter_settings.update(start=period[0].isoformat(), end=period[1].isoformat())
+if departments:
+    input_filter_settings['departments'] = departments
+if matricules:
+    input_filter_settings['matricules'] = matricules
 
 if uploaded_file is not None:
     # Traiter le fichier
     try:
-        # Analyser le fichier d'entrée
-        df_input = parse_input_csv(uploaded_file)
+        # Réutiliser le résultat si le même fichier a déjà été traité avec les mêmes paramètres
+        file_bytes = uploaded_file.getvalue()
+        cache = get_result_cache()
+        store = get_result_store() if incremental_mode else None
+        
+        # En mode incrémental, le résultat dépend aussi de l'état de l'historique
+        settings = {'streaming_mode': streaming_mode, 'conditional_formatting': conditional_formatting, 'split_by': split_by}
+        schedule_bytes = schedule_file.getvalue() if schedule_file is not None else None
+        if schedule_bytes is not None:
+            settings['horaires'] = hashlib.sha256(schedule_bytes).hexdigest()
+        if input_filter_settings:
+            settings['filtre'] = input_filter_settings
+        # Une même demande (fichier et paramètres, hors état de l'historique) n'est soumise qu'une fois
+        request_key = result_cache_key(file_bytes, **settings)
+        if store is not None:
+            settings['store_revision'] = store.revision()
+        result = cache.get(result_cache_key(file_bytes, **settings))
+        
+        # Traitement de cette session pour la même demande (en cours ou terminé)
+        job = st.session_state.get('job')
+        own_job = job is not None and job.key == request_key
+        if result is None:
+            if not own_job:
+                runner = get_job_runner()
+                job = runner.submit(
+                    request_key, uploaded_file.name, process_upload,
+                    file_bytes, uploaded_file.name, settings, cache, store, schedule_bytes, incremental_mode,
+                    workers=runner.split_workers, stages=STREAMING_PROGRESS_STAGES if streaming_mode else PROGRESS_STAGES
+                )
+                st.session_state.job = job
+                own_job = True
+            elif job.done() and job.error() is None:
+                # Résultat trop volumineux pour le cache: conservé par le traitement de la session
+                result = job.result()
+        from_cache = not own_job
         
-        if df_input is None:
-            st.error("Échec de l'analyse du fichier d'entrée. Veuillez vérifier le format.")
+        if result is None and not job.done():
+            # Le traitement continue en arrière-plan; la page reste utilisable pendant ce temps
+            show_job_progress(job)
+        elif result is None:
+            if isinstance(job.error(), MemoryBudgetError):
+                st.error(str(job.error()))
+                st.info("Activez le mode streaming ou limitez la période avec les filtres pour réduire la mémoire utilisée.")
+            elif isinstance(job.error(), InputFormatError):
+                st.error(str(job.error()))
+                st.error("Échec de l'analyse du fichier d'entrée. Veuillez vérifier le format.")
+            else:
+                raise job.error()
         else:
-            
-            # Traiter les entrées de temps
-            df_processed = process_time_entries(df_input)
-            
-            
-            
-            # Compter et afficher les entrées qui nécessitent une vérification
-            recheck_entries = df_processed[df_processed['Observations'].str.contains('À VÉRIFIER', na=False)]
+            # Afficher les entrées qui nécessitent une vérification
+            recheck_entries = result['recheck_entries']
             if not recheck_entries.empty:
-                st.warning(f"Trouvé {len(recheck_entries)} entrées avec 5 valeurs qui nécessitent une vérification.")
+                st.warning(f"Trouvé {len(recheck_entries)} entrées normalisées qui nécessitent une vérification.")
                 
                 # Option pour afficher les entrées qui nécessitent une vérification
                 if st.checkbox("Afficher les entrées qui nécessitent une vérification"):
-                    st.dataframe(recheck_entries)
+                    show_review(get_review_index(result))
             
-            # Obtenir la plage de dates pour le titre du rapport
-            try:
-                dates = pd.to_datetime(df_processed['Date'], format='%d/%m/%Y')
-                start_date = dates.min().strftime('%d/%m/%Y')
-                end_date = dates.max().strftime('%d/%m/%Y')
-            except:
-                # Repli si l'analyse de date échoue
-                start_date = "01/01/2025"
-                end_date = "31/12/2025"
+            # Synthèse par employé et par département (reprise dans la feuille "Synthèse" du rapport)
+            with st.expander("Synthèse"):
+                by = st.radio("Regrouper par", ["Matricule", "Départment"], horizontal=True, format_func={'Matricule': "Employé", 'Départment': "Département"}.get)
+                st.dataframe(format_summary(result['summary'][by]), hide_index=True)
             
-            # Créer le fichier Excel stylisé avec les deux feuilles
-            excel_output = create_styled_excel(df_processed, df_input, start_date, end_date)
+            # Fournir un bouton de téléchargement: le fichier n'est lu (depuis la mémoire ou le disque) qu'au clic
+            if result['zip_file'] is not None:
+                st.download_button(
+                    label="Télécharger les Rapports Excel (zip)",
+                    data=result['zip_file'].getvalue,
+                    file_name="Etats_de_pointage.zip",
+                    mime="application/zip"
+                )
+            else:
+                st.download_button(
+                    label="Télécharger le Rapport Excel",
+                    data=result['excel_file'].getvalue,
+                    file_name="Etat_de_pointage.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
             
-            # Fournir un bouton de téléchargement
+            # Export colonne typé pour les traitements en aval (paie, BI)
             st.download_button(
-                label="Télécharger le Rapport Excel",
-                data=excel_output,
-                file_name="Etat_de_pointage.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                label="Télécharger les résultats (Parquet)",
+                data=result['parquet_file'].getvalue,
+                file_name="Etat_de_pointage.parquet",
+                mime="application/vnd.apache.parquet"
             )
-        
+            
+            # Mesures par étape pour identifier le goulot d'étranglement (analyse, calcul ou écriture)
+            with st.expander("Diagnostics de performance"):
+                if from_cache:
+                    st.caption("Résultat réutilisé depuis le cache: mesures du traitement d'origine.")
+                st.dataframe(pd.DataFrame(result['diagnostics']).rename(columns={
+                    'etape': 'Étape',
+                    'secondes': 'Durée (s)',
+                    'lignes': 'Lignes',
+                    'lignes_par_seconde': 'Lignes/s',
+                    'pic_memoire_mo': "Pic mémoire de l'étape (Mo)",
+                    'memoire_traitement_mo': 'Données du traitement (Mo)'
+                }))
+                job_memory = [stage['memoire_traitement_mo'] for stage in result['diagnostics'] if stage.get('memoire_traitement_mo') is not None]
+                if job_memory:
+                    st.caption(f"Pic des données du traitement: {max(job_memory):.0f} Mo (budget: {MEMORY_BUDGET_MB} Mo)")
+                st.caption(f"Mesures enregistrées dans {DIAGNOSTICS_LOG_PATH}")
+    
     except Exception as e:
         st.error(f"Erreur lors du traitement du fichier: {str(e)}")
         st.exception(e)
@@ -0,0 +1,221 @@
+"""
+Traitement par lots des exports de pointage, sans interface Streamlit.
+
+Exemples:
+    python batch.py exports/ -o rapports/
+    python batch.py "exports/**/*.csv" --par-site --workers 8
+    python batch.py exports/ --parquet
+    python batch.py export.csv --scinder departement
+    python batch.py exports/ --horaires horaires.csv
+    python batch.py cumul.csv --du 06/01/2025 --au 12/01/2025 --departements IT,RH
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from pointage import InputFilter, InputFormatError, load_schedules, run_pipeline
+from result_store import ResultStore
+
+# Extensions des fichiers d'entrée acceptés (exports CSV, classeurs Excel et exports colonne Parquet)
+INPUT_SUFFIXES = {'.csv', '.xlsx', '.xls', '.parquet'}
+
+# Fonction pour lister les fichiers d'entrée désignés par les arguments
+def collect_input_files(inputs):
+    """
+    Développer les arguments (fichiers, répertoires ou motifs glob) en liste de fichiers d'entrée.
+    
+    Args:
+        inputs: Liste de chemins de fichiers, de répertoires (parcourus récursivement) ou de motifs glob
+    
+    Returns:
+        Liste triée et sans doublons de Path
+    """
+    files = set()
+    for pattern in inputs:
+        path = Path(pattern)
+        if path.is_dir():
+            files.update(p for p in path.rglob('*') if p.suffix.lower() in INPUT_SUFFIXES)
+        elif glob.has_magic(pattern):
+            files.update(Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file())
+        elif path.is_file():
+            files.add(path)
+        else:
+            print(f"Avertissement: aucun fichier trouvé pour {pattern}", file=sys.stderr)
+    return sorted(files)
+
+# Fonction pour répartir les fichiers en rapports (un par fichier ou un par site)
+def plan_reports(files, output_dir, by_site=False):
+    """
+    Associer chaque rapport à produire aux fichiers d'entrée qu'il regroupe.
+    
+    Args:
+        files: Liste de Path des fichiers d'entrée
+        output_dir: Répertoire de sortie des rapports
+        by_site: Si True, les fichiers d'un même répertoire (un site) forment un seul rapport
+    
+    Returns:
+        Liste de tuples (liste de chemins d'entrée, chemin du rapport)
+    """
+    output_dir = Path(output_dir)
+    if not by_site:
+        # Préfixer par le répertoire lorsque deux fichiers portent le même nom, puis ajouter
+        # l'extension lorsqu'ils sont dans des répertoires de même nom (jan.csv et jan.xlsx)
+        stems = Counter(f.stem for f in files)
+        site_stems = Counter((f.parent.name, f.stem) for f in files)
+        names = []
+        for f in files:
+            name = f"{f.parent.name}_{f.stem}" if stems[f.stem] > 1 else f.stem
+            if site_stems[(f.parent.name, f.stem)] > 1:
+                name += f"_{f.suffix.lstrip('.').lower()}"
+            names.append(name)
+        return list(zip([[str(f)] for f in files], unique_report_paths(output_dir, names)))
+    
+    sites = {}
+    for f in files:
+        sites.setdefault(f.parent, []).append(str(f))
+    sites = sorted(sites.items())
+    names = [f"Etat_de_pointage_{site.name or 'racine'}" for site, _ in sites]
+    return list(zip([site_files for _, site_files in sites], unique_report_paths(output_dir, names)))
+
+# Fonction pour associer un chemin de rapport .xlsx distinct à chaque nom
+def unique_report_paths(output_dir, names):
+    """
+    Deux rapports ne doivent jamais s'écrire dans le même fichier: un nom déjà pris
+    (sans tenir compte de la casse) reçoit un suffixe numérique (_2, _3, ...).
+    """
+    used = set()
+    paths = []
+    for name in names:
+        candidate, number = name, 2
+        while candidate.lower() in used:
+            candidate, number = f"{name}_{number}", number + 1
+        used.add(candidate.lower())
+        paths.append(str(Path(output_dir) / f"{candidate}.xlsx"))
+    return paths
+
+# Colonnes de découpage des rapports selon l'option --scinder
+SPLIT_CHOICES = {'departement': 'Départment', 'matricule': 'Matricule'}
+
+# Fonction pour lire une date JJ/MM/AAAA des options --du et --au
+def parse_date_argument(value):
+    try:
+        return datetime.strptime(value, '%d/%m/%Y')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide (JJ/MM/AAAA attendu): {value}")
+
+# Fonction pour lire une liste de valeurs séparées par des virgules
+def parse_list_argument(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+# Fonction exécutée dans un processus de travail pour produire un rapport
+def export_report(input_paths, output_path, streaming_mode=False, conditional_formatting=False, store_path=None, columnar_output=False, split_by=None, split_workers=1, schedules_path=None, input_filter=None):
+    """
+    Produire un rapport Excel à partir d'un ou plusieurs fichiers d'entrée.
+    
+    Avec columnar_output, l'export Parquet typé est écrit à côté du rapport (même nom, extension .parquet).
+    Avec split_by, le rapport est une archive zip d'un classeur par groupe (même nom, extension .zip).
+    Avec schedules_path, les horaires de travail sont chargés depuis ce fichier (voir load_schedules).
+    Avec input_filter, seules les lignes retenues (voir InputFilter) sont traitées.
+    
+    Returns:
+        Dictionnaire décrivant le résultat (chemin, lignes à vérifier, durée, erreur éventuelle).
+        Toute erreur (format, fichier corrompu, écriture) est rapportée dans le résultat
+        au lieu d'interrompre les autres rapports du lot.
+    """
+    start = time.perf_counter()
+    try:
+        store = ResultStore(store_path) if store_path else None
+        schedules = load_schedules(schedules_path) if schedules_path else None
+        result = run_pipeline(
+            input_paths, streaming_mode, conditional_formatting, store, columnar_output,
+            split_by=split_by, workers=split_workers, schedules=schedules, input_filter=input_filter, keep_frames=False
+        )
+        
+        # Les fichiers produits sont copiés par blocs, sans être chargés entièrement en mémoire
+        if split_by is not None:
+            output_path = str(Path(output_path).with_suffix('.zip'))
+            result['zip_file'].copy_to(output_path)
+        else:
+            result['excel_file'].copy_to(output_path)
+        if columnar_output:
+            result['parquet_file'].copy_to(Path(output_path).with_suffix('.parquet'))
+    except InputFormatError as e:
+        return {'output': output_path, 'error': str(e)}
+    except Exception as e:
+        return {'output': output_path, 'error': f"{type(e).__name__}: {str(e).strip()}"}
+    
+    return {
+        'output': output_path,
+        'error': None,
+        'rows': result['rows'],
+        'recheck': len(result['recheck_entries']),
+        'seconds': time.perf_counter() - start
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Générer les rapports Excel de pointage pour plusieurs exports CSV, Excel ou Parquet.")
+    parser.add_argument('inputs', nargs='+', help="Fichiers CSV, Excel (.xlsx, .xls) ou Parquet, répertoires ou motifs glob")
+    parser.add_argument('-o', '--output-dir', default='rapports', help="Répertoire des rapports générés (défaut: rapports)")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help="Nombre de processus (défaut: nombre de cœurs)")
+    parser.add_argument('--par-site', action='store_true', help="Un rapport par répertoire (site) au lieu d'un rapport par fichier")
+    parser.add_argument('--streaming', action='store_true', help="Lire et écrire chaque fichier par blocs (mémoire bornée)")
+    parser.add_argument('--mise-en-forme-conditionnelle', action='store_true', help="Utiliser des règles Excel au lieu du style cellule par cellule")
+    parser.add_argument('--historique', metavar='CHEMIN', help="Base SQLite pour le traitement incrémental (lignes déjà calculées réutilisées, cumuls repris)")
+    parser.add_argument('--parquet', action='store_true', help="Écrire aussi les résultats au format Parquet typé à côté de chaque rapport")
+    parser.add_argument('--horaires', metavar='CHEMIN', help="Fichier CSV des horaires de travail par Matricule, Départment et jour de la semaine")
+    parser.add_argument('--du', type=parse_date_argument, metavar='JJ/MM/AAAA', help="Première date retenue (incluse)")
+    parser.add_argument('--au', type=parse_date_argument, metavar='JJ/MM/AAAA', help="Dernière date retenue (incluse)")
+    parser.add_argument('--departements', type=parse_list_argument, metavar='LISTE', help="Départements retenus, séparés par des virgules")
+    parser.add_argument('--matricules', type=parse_list_argument, metavar='LISTE', help="Matricules retenus, séparés par des virgules")
+    parser.add_argument('--scinder', choices=list(SPLIT_CHOICES), help="Un classeur par département ou par employé, regroupés dans une archive zip par rapport")
+    args = parser.parse_args(argv)
+    
+    if args.historique and args.streaming:
+        parser.error("--historique n'est pas compatible avec --streaming")
+    if args.scinder and args.streaming:
+        parser.error("--scinder n'est pas compatible avec --streaming")
+    
+    files = collect_input_files(args.inputs)
+    if not files:
+        print("Aucun fichier d'entrée à traiter.", file=sys.stderr)
+        return 1
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = plan_reports(files, args.output_dir, args.par_site)
+    
+    # Les processus restants (moins de rapports que de processus) écrivent les classeurs scindés
+    split_by = SPLIT_CHOICES.get(args.scinder)
+    split_workers = max(1, args.workers // len(jobs))
+    # Les lignes hors de la période, des départements ou des matricules demandés sont écartées à la lecture
+    input_filter = InputFilter(args.du, args.au, args.departements, args.matricules) or None
+    
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(jobs)))) as executor:
+        futures = {
+            executor.submit(export_report, input_paths, output_path, args.streaming, args.mise_en_forme_conditionnelle, args.historique, args.parquet, split_by, split_workers, args.horaires, input_filter): output_path
+            for input_paths, output_path in jobs
+        }
+        for future in as_completed(futures):
+            # Un processus de travail interrompu (mémoire, signal) ne fait échouer que son rapport
+            try:
+                report = future.result()
+            except Exception as e:
+                report = {'output': futures[future], 'error': f"{type(e).__name__}: {str(e).strip()}"}
+            if report['error']:
+                failures += 1
+                print(f"ÉCHEC {report['output']}: {report['error']}", file=sys.stderr)
+            else:
+                print(f"OK {report['output']} ({report['rows']} lignes, {report['recheck']} à vérifier, {report['seconds']:.1f} s)")
+    
+    print(f"{len(jobs) - failures}/{len(jobs)} rapports générés dans {args.output_dir}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Banc d'essai des étapes du traitement de pointage sur des données synthétiques.
+
+Chaque étape (analyse du CSV, normalisation, calcul, écriture Excel) est mesurée
+séparément: durée, débit en lignes par seconde et pic mémoire. Les résultats
+peuvent être enregistrés puis comparés à une référence.
+
+Exemples:
+    python benchmark.py                                  # 10k, 100k et 1M lignes
+    python benchmark.py --lignes 10000 100000 --sauver reference.json
+    python benchmark.py --lignes 100000 --reference reference.json
+    python benchmark.py --melange 0=0.1,2=0.1,4=0.5,5=0.2,irregulier=0.1 --sans-entete
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from pointage import (
+    FULL_DAY_PUNCHES, HHMM_LOOKUP, INPUT_COLUMNS, create_styled_excel, get_date_range,
+    normalize_punch_batch, parse_input_csv, parse_minutes, process_time_entries
+)
+
+# Tailles mesurées par défaut (nombre de lignes)
+DEFAULT_ROWS = [10000, 100000, 1000000]
+
+# Nombre de jours par employé dans les fichiers générés
+DEFAULT_DAYS = 30
+
+# Proportions par défaut des types de lignes (nombre de pointages)
+DEFAULT_MIX = {'0': 0.05, '2': 0.10, '4': 0.65, '5': 0.10, 'irregulier': 0.10}
+
+# Nombres de pointages possibles pour les lignes irrégulières
+IRREGULAR_COUNTS = [1, 3, 6, 7, 8]
+
+# Départements attribués aux employés générés
+DEPARTMENTS = ['RH', 'IT', 'OPS', 'PROD', 'LOG']
+
+# Étapes mesurées, dans l'ordre du traitement
+STAGES = ['parse_input_csv', 'normalize_punch_batch', 'process_time_entries', 'create_styled_excel']
+
+# Fonction pour générer un export CSV de pointage synthétique
+def generate_csv(employees, days=DEFAULT_DAYS, mix=DEFAULT_MIX, header=True, seed=0):
+    """
+    Générer un fichier CSV synthétique au format Matricule;Nom;Départment;Date;Pointages.
+    
+    Args:
+        employees: Nombre d'employés
+        days: Nombre de jours consécutifs par employé (à partir du 01/01/2025)
+        mix: Proportions des types de lignes: '0' (absent), '2', '4', '5' (4 pointages
+            et un doublon) et 'irregulier' (1, 3 ou 6 à 8 pointages)
+        header: Si False, le fichier n'a pas de ligne d'en-tête
+        seed: Graine du générateur aléatoire
+    
+    Returns:
+        Contenu du fichier CSV (octets UTF-8)
+    """
+    rng = np.random.default_rng(seed)
+    n = employees * days
+    kinds = np.array(list(mix))
+    weights = np.array(list(mix.values()), dtype=float)
+    kind = rng.choice(kinds, size=n, p=weights / weights.sum())
+    
+    # Journée type: entrée ~08:00, pause ~13:00-14:00, sortie ~18:00
+    base = np.column_stack([
+        8 * 60 + rng.integers(-20, 21, n),
+        13 * 60 + rng.integers(-10, 11, n),
+        14 * 60 + rng.integers(-10, 11, n),
+        18 * 60 + rng.integers(-30, 31, n)
+    ])
+    punches = np.full((n, max(IRREGULAR_COUNTS) + 1), -1)
+    columns = np.arange(punches.shape[1])
+    
+    full = kind == '4'
+    punches[full, :4] = base[full]
+    
+    two = kind == '2'
+    punches[two, 0] = base[two, 0]
+    punches[two, 1] = 17 * 60 + rng.integers(-30, 31, two.sum())
+    
+    # Quatre pointages et le doublon (0 à 4 minutes) de l'un d'eux
+    five = kind == '5'
+    duplicated = rng.integers(0, 4, n)[five]
+    source = np.where(columns[:5] <= duplicated[:, None], columns[:5], columns[:5] - 1)
+    values = np.take_along_axis(base[five], source, axis=1)
+    values += np.where(columns[:5] == duplicated[:, None] + 1, rng.integers(0, 5, five.sum())[:, None], 0)
+    punches[five, :5] = values
+    
+    # Pointages aléatoires triés entre 07:00 et 20:00
+    irregular = kind == 'irregulier'
+    counts = rng.choice(IRREGULAR_COUNTS, size=irregular.sum())
+    random_punches = rng.integers(7 * 60, 20 * 60, (irregular.sum(), punches.shape[1]))
+    random_punches = np.sort(np.where(columns < counts[:, None], random_punches, np.iinfo(np.int64).max), axis=1)
+    punches[irregular] = np.where(columns < counts[:, None], random_punches, -1)
+    
+    text = np.where(punches >= 0, HHMM_LOOKUP[np.clip(punches, 0, None)], '')
+    pointages = np.array([' '.join(t for t in row if t) for row in text], dtype=object)
+    
+    employee = np.repeat(np.arange(employees), days)
+    dates = pd.date_range('2025-01-01', periods=days, freq='D').strftime('%d/%m/%Y').to_numpy(dtype=object)
+    lines = (
+        (10000 + employee).astype(str).astype(object) + ';Nom ' + employee.astype(str).astype(object) + ';'
+        + np.array(DEPARTMENTS, dtype=object)[employee % len(DEPARTMENTS)] + ';'
+        + np.tile(dates, employees) + ';' + pointages
+    )
+    
+    content = '\n'.join(lines) + '\n'
+    if header:
+        content = ';'.join(INPUT_COLUMNS) + '\n' + content
+    return content.encode('utf-8')
+
+# Fonction pour analyser une option --melange ("0=0.1,2=0.2,...")
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        kind, _, weight = item.partition('=')
+        if kind.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Type de ligne inconnu: {kind} (attendu: {', '.join(DEFAULT_MIX)})")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+# Fonction pour préparer les entrées de chaque étape à partir du fichier généré
+def prepare_stages(csv_bytes):
+    """
+    Exécuter une fois le traitement complet pour obtenir l'entrée de chaque étape.
+    
+    Returns:
+        Dictionnaire {étape: (fonction sans argument, nombre de lignes traitées)}
+    """
+    df_input = parse_input_csv(io.BytesIO(csv_bytes))
+    df_processed = process_time_entries(df_input)
+    start_date, end_date = get_date_range(df_processed['Date'])
+    
+    # La normalisation ne s'applique qu'aux lignes de 3 valeurs ou plus de 4, converties
+    # en minutes comme dans le traitement (une colonne par heure pointée)
+    tokens = df_input['Pointages'].str.split(expand=True)
+    counts = tokens.notna().sum(axis=1).to_numpy()
+    to_normalize = (counts == 3) | (counts > FULL_DAY_PUNCHES)
+    subset = tokens.loc[to_normalize]
+    punches = np.column_stack([parse_minutes(subset[j]) for j in subset.columns])
+    subset_counts = counts[to_normalize]
+    
+    return {
+        'parse_input_csv': (lambda: parse_input_csv(io.BytesIO(csv_bytes)), len(df_input)),
+        'normalize_punch_batch': (lambda: normalize_punch_batch(punches, subset_counts), len(subset_counts)),
+        'process_time_entries': (lambda: process_time_entries(df_input), len(df_input)),
+        'create_styled_excel': (lambda: create_styled_excel(df_processed, df_input, start_date, end_date), len(df_processed))
+    }
+
+# Fonction pour mesurer la durée (meilleure de plusieurs répétitions) et le pic mémoire d'une étape
+def measure(func, repeat=1, memory=True):
+    """
+    Mesurer une étape.
+    
+    La durée est mesurée sans tracemalloc (qui ralentit les allocations); le pic
+    mémoire (allocations Python et NumPy suivies par tracemalloc) est mesuré lors
+    d'une exécution séparée, nettement plus lente pour l'écriture Excel.
+    
+    Returns:
+        Tuple (secondes, pic mémoire en Mo ou None)
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds = min(seconds, time.perf_counter() - start)
+    
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+    return seconds, peak_mb
+
+# Fonction pour exécuter le banc d'essai pour une taille donnée
+def run_benchmark(rows, days=DEFAULT_DAYS, mix=DEFAULT_MIX, header=True, repeat=1, memory=True, seed=0):
+    """
+    Mesurer chaque étape sur un fichier synthétique d'environ rows lignes.
+    
+    Returns:
+        Liste de dictionnaires (lignes, étape, lignes_traitees, secondes, lignes_par_seconde, pic_mo, erreur)
+    """
+    csv_bytes = generate_csv(max(1, rows // days), days, mix, header, seed)
+    try:
+        stages = prepare_stages(csv_bytes)
+    except Exception as e:
+        return [{'lignes': rows, 'etape': STAGES[0], 'erreur': f"{type(e).__name__}: {e}"}]
+    
+    results = []
+    for stage in STAGES:
+        func, processed_rows = stages[stage]
+        seconds, peak_mb = measure(func, repeat, memory)
+        results.append({
+            'lignes': rows,
+            'etape': stage,
+            'lignes_traitees': processed_rows,
+            'secondes': seconds,
+            'lignes_par_seconde': processed_rows / seconds if seconds > 0 else None,
+            'pic_mo': peak_mb,
+            'erreur': None
+        })
+    return results
+
+# En-tête du tableau des résultats
+RESULT_HEADER = f"{'Lignes':>9}  {'Étape':<22}{'Traitées':>10}{'Durée (s)':>11}{'Lignes/s':>12}{'Pic (Mo)':>10}  Référence"
+
+# Fonction pour formater une ligne de résultat, avec le rapport à la référence s'il y en a une
+def format_result(r, reference=None):
+    if r['erreur']:
+        return f"{r['lignes']:>9}  {r['etape']:<22}ÉCHEC: {r['erreur']}"
+    peak = '-' if r['pic_mo'] is None else f"{r['pic_mo']:.1f}"
+    rate = '-' if r['lignes_par_seconde'] is None else f"{r['lignes_par_seconde']:,.0f}"
+    base = (reference or {}).get((r['lignes'], r['etape']))
+    comparison = f"x{base['secondes'] / r['secondes']:.2f}" if base and r['secondes'] > 0 else ''
+    return f"{r['lignes']:>9}  {r['etape']:<22}{r['lignes_traitees']:>10}{r['secondes']:>11.3f}{rate:>12}{peak:>10}  {comparison}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesurer les étapes du traitement de pointage sur des données synthétiques.")
+    parser.add_argument('--lignes', type=int, nargs='+', default=DEFAULT_ROWS, help="Tailles à mesurer (défaut: 10000 100000 1000000)")
+    parser.add_argument('--jours', type=int, default=DEFAULT_DAYS, help=f"Jours par employé (défaut: {DEFAULT_DAYS})")
+    parser.add_argument('--melange', type=parse_mix, default=DEFAULT_MIX, help="Proportions des lignes, ex. 0=0.05,2=0.1,4=0.65,5=0.1,irregulier=0.1")
+    parser.add_argument('--sans-entete', action='store_true', help="Générer des fichiers sans ligne d'en-tête")
+    parser.add_argument('--repetitions', type=int, default=1, help="Nombre d'exécutions chronométrées (la meilleure est retenue)")
+    parser.add_argument('--sans-memoire', action='store_true', help="Ne pas mesurer le pic mémoire (plus rapide)")
+    parser.add_argument('--graine', type=int, default=0, help="Graine du générateur aléatoire")
+    parser.add_argument('--sauver', metavar='FICHIER', help="Enregistrer les résultats (JSON) pour servir de référence")
+    parser.add_argument('--reference', metavar='FICHIER', help="Comparer les durées à une référence enregistrée (xN = N fois plus rapide)")
+    parser.add_argument('--generer', metavar='FICHIER', help="Écrire uniquement le CSV synthétique de la première taille, sans mesure")
+    args = parser.parse_args(argv)
+    
+    if args.generer:
+        with open(args.generer, 'wb') as f:
+            f.write(generate_csv(max(1, args.lignes[0] // args.jours), args.jours, args.melange, not args.sans_entete, args.graine))
+        return 0
+    
+    parameters = {'jours': args.jours, 'melange': args.melange, 'entete': not args.sans_entete, 'graine': args.graine}
+    
+    reference = {}
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as f:
+            saved = json.load(f)
+        # Une référence mesurée sur d'autres données n'est pas comparable
+        mismatched = [key for key, value in parameters.items() if saved.get('parametres', {}).get(key) != value]
+        if mismatched:
+            parser.error(f"La référence {args.reference} a été mesurée avec d'autres paramètres: {', '.join(mismatched)}")
+        reference = {(r['lignes'], r['etape']): r for r in saved['resultats'] if not r.get('erreur')}
+    
+    # Les résultats sont affichés au fil des tailles (les plus grandes peuvent prendre plusieurs minutes)
+    print(RESULT_HEADER, flush=True)
+    results = []
+    for rows in args.lignes:
+        size_results = run_benchmark(rows, args.jours, args.melange, not args.sans_entete, args.repetitions, not args.sans_memoire, args.graine)
+        for r in size_results:
+            print(format_result(r, reference), flush=True)
+        results.extend(size_results)
+    
+    if args.sauver:
+        with open(args.sauver, 'w', encoding='utf-8') as f:
+            json.dump({
+                'parametres': parameters,
+                'resultats': results
+            }, f, ensure_ascii=False, indent=2)
+    return 1 if any(r['erreur'] for r in results) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Exécution des traitements en arrière-plan pour l'application Streamlit.
+
+Les traitements sont soumis à un groupe de fils d'exécution de taille bornée: au-delà
+de MAX_CONCURRENT_JOBS traitements simultanés, les suivants attendent leur tour, ce qui
+garde le serveur réactif lorsque plusieurs utilisateurs importent des fichiers en même
+temps. La progression est lue dans les mesures (PipelineMetrics) du traitement en cours.
+Chaque traitement dispose d'un budget mémoire (MEMORY_BUDGET_MB) pour ses propres
+données (DataFrames et blocs en cours, voir PipelineMetrics.hold): au-delà, il est
+interrompu, sans effet sur les autres traitements, de sorte que les données de tous
+les traitements restent bornées par MAX_CONCURRENT_JOBS fois ce budget. Les classeurs scindés d'un traitement sont écrits par au plus
+SPLIT_WORKERS processus, de sorte que les traitements simultanés se partagent les cœurs.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pointage import PipelineMetrics
+
+# Nombre maximal de traitements exécutés simultanément (modifiable par la variable d'environnement POINTAGE_MAX_JOBS)
+MAX_CONCURRENT_JOBS = int(os.environ.get('POINTAGE_MAX_JOBS', '2'))
+
+# Budget mémoire d'un traitement, en Mo (modifiable par la variable d'environnement POINTAGE_BUDGET_MEMOIRE_MO)
+MEMORY_BUDGET_MB = int(os.environ.get('POINTAGE_BUDGET_MEMOIRE_MO', '1024'))
+
+# Processus d'écriture des classeurs scindés par traitement (modifiable par la variable d'environnement POINTAGE_PROCESSUS_SCISSION)
+SPLIT_WORKERS = int(os.environ.get('POINTAGE_PROCESSUS_SCISSION', max(1, (os.cpu_count() or 1) // MAX_CONCURRENT_JOBS)))
+
+# Étapes suivies dans la barre de progression, selon le mode de traitement
+PROGRESS_STAGES = ['Analyse', 'Calcul', 'Écriture Excel', 'Export Parquet']
+STREAMING_PROGRESS_STAGES = ['Plage de dates', 'Écriture Excel']
+
+class Job:
+    """
+    Traitement soumis au JobRunner: état, mesures en cours et résultat.
+    
+    La fonction exécutée reçoit les mesures du traitement (metrics) en plus de ses
+    arguments, de sorte que la progression est visible pendant l'exécution.
+    """
+    
+    def __init__(self, key, name, stages=PROGRESS_STAGES, memory_budget_mb=MEMORY_BUDGET_MB):
+        self.key = key
+        self.name = name
+        self.stages = stages
+        self.metrics = PipelineMetrics(memory_budget_mb)
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+    
+    def run(self, fn, *args, **kwargs):
+        self.started = time.time()
+        try:
+            return fn(*args, metrics=self.metrics, **kwargs)
+        finally:
+            self.finished = time.time()
+    
+    def done(self):
+        return self.future.done()
+    
+    def result(self):
+        """Résultat du traitement (lève l'exception du traitement en cas d'échec)."""
+        return self.future.result()
+    
+    def error(self):
+        """Exception levée par le traitement terminé, ou None."""
+        return self.future.exception() if self.future.done() else None
+    
+    def progress(self):
+        """
+        Avancement estimé du traitement.
+        
+        Chaque étape de stages compte pour une part égale; l'étape en cours avance avec le
+        nombre de lignes traitées lorsque le nombre total de lignes est connu.
+        
+        Returns:
+            Tuple (fraction entre 0 et 1, texte décrivant l'étape et les lignes traitées)
+        """
+        if self.future.done():
+            return 1.0, "Terminé"
+        if self.started is None:
+            return 0.0, "En attente d'un emplacement de traitement libre"
+        
+        current = self.metrics.current_stage
+        expected = self.metrics.expected_rows
+        completed = 0.0
+        for stage in self.stages:
+            record = self.metrics.stages.get(stage)
+            if stage == current:
+                rows = record['rows'] if record else 0
+                completed += min(rows / expected, 1.0) if expected else 0.0
+            elif record is not None:
+                completed += 1.0
+        
+        text = current or "Préparation"
+        rows = self.metrics.stages.get(current, {}).get('rows', 0) if current else 0
+        if rows:
+            text += f": {rows:,} lignes".replace(',', ' ') + (f" sur {expected:,}".replace(',', ' ') if expected else '')
+        return min(completed / len(self.stages), 1.0), text
+
+class JobRunner:
+    """
+    Groupe de fils d'exécution partagé entre les sessions Streamlit.
+    
+    Les traitements en attente ou en cours sont indexés par clé: une même demande
+    (même fichier, mêmes paramètres) soumise par plusieurs sessions n'est exécutée
+    qu'une fois. Un traitement terminé est retiré de l'index; la session qui l'a
+    soumis garde une référence au Job pour en récupérer le résultat.
+    """
+    
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS, memory_budget_mb=MEMORY_BUDGET_MB, split_workers=SPLIT_WORKERS):
+        self.max_workers = max_workers
+        self.memory_budget_mb = memory_budget_mb
+        self.split_workers = split_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pointage-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, key, name, fn, *args, stages=PROGRESS_STAGES, **kwargs):
+        """
+        Soumettre fn(*args, metrics=..., **kwargs), ou retrouver la même demande déjà soumise.
+        
+        Returns:
+            Job
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            job = Job(key, name, stages, self.memory_budget_mb)
+            job.future = self._executor.submit(job.run, fn, *args, **kwargs)
+            self._jobs[key] = job
+        job.future.add_done_callback(lambda _: self._forget(key))
+        return job
+    
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+    
+    def active_count(self):
+        """Nombre de traitements en cours et en attente."""
+        with self._lock:
+            return len(self._jobs)
+    
+    def _forget(self, key):
+        with self._lock:
+            self._jobs.pop(key, None)
@@ -0,0 +1,2251 @@
+"""
+Traitement des données de pointage: analyse des exports CSV et Excel, calcul des heures
+et génération du rapport Excel stylisé.
+
+Ce module ne dépend pas de Streamlit et peut être importé par l'application
+(app.py) comme par le traitement par lots en ligne de commande (batch.py).
+"""
+
+import codecs
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Border, Side, Alignment, Font, NamedStyle
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.utils import get_column_letter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Lecture des classeurs .xls (ancien format Excel), optionnelle
+try:
+    import xlrd
+except ImportError:
+    xlrd = None
+
+# Colonnes attendues dans le fichier d'entrée
+INPUT_COLUMNS = ['Matricule', 'Nom', 'Départment', 'Date', 'Pointages']
+
+# Nombre de lignes lues par bloc en mode streaming
+CHUNK_SIZE = 50000
+
+# Erreur levée lorsque le fichier d'entrée n'a pas le format attendu
+class InputFormatError(ValueError):
+    pass
+
+# Taille de l'échantillon lu au début du fichier pour en détecter le format
+SNIFF_BYTES = 64 * 1024
+
+# Séparateurs reconnus, par ordre de préférence
+DELIMITERS = [';', ',', '\t', '|']
+
+# Encodages essayés sur l'échantillon (exports des terminaux de badgeage en cp1252/latin-1)
+ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+
+# Format détecté d'un fichier CSV d'entrée
+InputFormat = namedtuple('InputFormat', ['encoding', 'delimiter', 'header', 'quoted_lines', 'field_count', 'columns'])
+
+# Fonction pour lire le début d'un fichier sans le consommer
+def read_sample(file, size=SNIFF_BYTES):
+    if hasattr(file, 'read'):
+        position = file.tell()
+        sample = file.read(size)
+        file.seek(position)
+        return sample.encode('utf-8') if isinstance(sample, str) else sample
+    with open(file, 'rb') as f:
+        return f.read(size)
+
+# Fonction pour détecter l'encodage d'un échantillon
+def sniff_encoding(sample):
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    for encoding in ENCODINGS:
+        try:
+            # Un caractère multi-octets peut être coupé à la fin de l'échantillon
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+# Fonction pour détecter le format d'un fichier CSV à partir de ses premiers octets
+def sniff_input_format(file):
+    """
+    Détecter l'encodage, le séparateur, la présence d'en-têtes et les lignes entières
+    entre guillemets à partir du début du fichier, pour ensuite l'analyser en une passe.
+    
+    Args:
+        file: Chemin ou objet fichier du CSV
+    
+    Returns:
+        InputFormat
+    
+    Raises:
+        InputFormatError: Si le fichier est vide ou contient moins de 5 colonnes
+    """
+    sample = read_sample(file)
+    encoding = sniff_encoding(sample)
+    text = sample.decode(encoding, errors='ignore')
+    lines = [line for line in text.splitlines() if line.strip()]
+    # La dernière ligne de l'échantillon peut être incomplète
+    if len(sample) == SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]
+    if not lines:
+        raise InputFormatError("Le fichier d'entrée est vide")
+    
+    # Lignes entières entre guillemets ("1000;Nom;...;08:00 17:00"), la ligne d'en-tête
+    # pouvant ne pas l'être; à distinguer des champs tous entre guillemets ("1000";"Nom";...),
+    # dont l'intérieur contient d'autres guillemets
+    is_quoted = [len(line) > 1 and line.startswith('"') and line.endswith('"') and '"' not in line[1:-1] for line in lines]
+    quoted_lines = all(is_quoted[1:] or is_quoted)
+    if quoted_lines:
+        lines = [line[1:-1] if quoted else line for line, quoted in zip(lines, is_quoted)]
+    
+    # Séparateur présent au moins 4 fois (5 colonnes attendues) sur la majorité des lignes:
+    # les lignes plus courtes (absence sans séparateur final, ligne de total) sont complétées
+    counts = {d: sorted(line.count(d) for line in lines)[len(lines) // 2] for d in DELIMITERS}
+    delimiter = next((d for d in DELIMITERS if counts[d] >= len(INPUT_COLUMNS) - 1), None)
+    if delimiter is None:
+        found = max(counts.values()) + 1
+        raise InputFormatError(f"Erreur de format CSV: Au moins 5 colonnes attendues, {found} trouvées")
+    
+    # Pas d'en-têtes si la première ligne contient déjà une date dans la colonne Date
+    first_fields = [field.strip().strip('"') for field in lines[0].split(delimiter)]
+    header = not is_valid_date((first_fields + [''] * len(INPUT_COLUMNS))[INPUT_COLUMNS.index('Date')])
+    if header:
+        columns = name_input_columns(first_fields)
+    else:
+        # En supposant que les colonnes sont: Matricule, Nom, Départment, Date, Pointages
+        field_count = max(line.count(delimiter) for line in lines) + 1
+        columns = INPUT_COLUMNS + [f'Extra{i}' for i in range(field_count - len(INPUT_COLUMNS))]
+    
+    return InputFormat(encoding, delimiter, header, quoted_lines, len(columns), columns)
+
+# Fonction pour lire le fichier CSV d'entrée par blocs
+def iter_input_csv(file, chunksize=CHUNK_SIZE, columns=None):
+    """
+    Lire le fichier CSV d'entrée par blocs de taille fixe.
+    
+    Le format (encodage, séparateur, en-têtes) est détecté sur le début du fichier,
+    puis le fichier est analysé une seule fois par le lecteur C de pandas.
+    La mémoire utilisée est bornée par la taille d'un bloc et non par celle du fichier.
+    
+    Args:
+        file: Chemin ou objet fichier du CSV
+        chunksize: Nombre de lignes par bloc
+        columns: Colonnes d'entrée à lire (par exemple ['Date']); toutes si None
+    
+    Yields:
+        DataFrames de chaînes avec les colonnes Matricule, Nom, Départment, Date, Pointages
+        (ou seulement les colonnes demandées)
+    
+    Raises:
+        InputFormatError: Si le fichier est vide, contient moins de 5 colonnes ou des
+            caractères invalides pour tous les encodages essayés
+    """
+    input_format = sniff_input_format(file)
+    # Seules les colonnes demandées sont converties par le lecteur (repérées par position)
+    positions = None if columns is None else sorted(input_format.columns.index(column) for column in columns)
+    start = file.tell() if hasattr(file, 'read') else None
+    
+    # L'encodage est détecté sur le début du fichier: si un caractère invalide apparaît
+    # plus loin, le fichier est relu avec l'encodage suivant à partir de la ligne en cause
+    if input_format.encoding in ENCODINGS:
+        encodings = ENCODINGS[ENCODINGS.index(input_format.encoding):]
+    else:
+        encodings = [input_format.encoding] + ENCODINGS[1:]
+    rows_done = 0
+    for encoding in encodings:
+        if start is not None:
+            file.seek(start)
+        skip = rows_done
+        try:
+            # Lire toutes les colonnes comme des chaînes, sans conversion des cellules vides en NaN
+            reader = pd.read_csv(
+                file,
+                sep=input_format.delimiter,
+                encoding=encoding,
+                header=0 if input_format.header else None,
+                names=None if input_format.header else input_format.columns,
+                usecols=positions,
+                quoting=csv.QUOTE_NONE if input_format.quoted_lines else csv.QUOTE_MINIMAL,
+                dtype=str,
+                na_filter=False,
+                chunksize=chunksize
+            )
+            with reader:
+                for chunk in reader:
+                    # Lignes déjà produites avec l'encodage précédent
+                    if skip >= len(chunk):
+                        skip -= len(chunk)
+                        continue
+                    if skip:
+                        chunk, skip = chunk.iloc[skip:].copy(), 0
+                    rows_done += len(chunk)
+                    if positions is None:
+                        yield clean_input_chunk(chunk, input_format)
+                    else:
+                        chunk.columns = [input_format.columns[position] for position in positions]
+                        if input_format.quoted_lines:
+                            chunk = chunk.apply(lambda values: values.str.strip('"'))
+                        yield chunk
+            return
+        except UnicodeDecodeError as e:
+            error = e
+    raise InputFormatError(f"Caractères invalides pour l'encodage détecté ({input_format.encoding}): {error}")
+
+# Fonction pour nettoyer un bloc du fichier CSV d'entrée
+def clean_input_chunk(chunk, input_format):
+    if input_format.quoted_lines:
+        # Retirer les guillemets qui entourent chaque ligne (et l'en-tête)
+        chunk.columns = [str(column).strip('"') for column in chunk.columns]
+        first, last = chunk.columns[0], chunk.columns[-1]
+        chunk[first] = chunk[first].str.lstrip('"')
+        chunk[last] = chunk[last].str.rstrip('"')
+    
+    chunk.columns = name_input_columns(chunk.columns)
+    
+    # Nettoyer la colonne Pointages - les cellules vides sont déjà des chaînes vides
+    chunk['Pointages'] = chunk['Pointages'].fillna('').replace('nan', '')
+    
+    return chunk
+
+# Fonction pour nommer les colonnes d'entrée d'après la ligne d'en-tête
+def name_input_columns(header):
+    header = [str(column) for column in header]
+    # En-têtes non reconnus (orthographe, accents): colonnes prises dans l'ordre attendu
+    if not set(INPUT_COLUMNS).issubset(header):
+        return INPUT_COLUMNS + header[len(INPUT_COLUMNS):]
+    return header
+
+# Signatures des classeurs Excel (premiers octets): .xlsx (archive zip) et .xls (OLE2)
+XLSX_MAGIC = b'PK\x03\x04'
+XLS_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# Fonction pour reconnaître le type d'un fichier d'entrée d'après ses premiers octets
+def detect_file_kind(file):
+    """
+    Returns:
+        'parquet', 'xlsx', 'xls' ou 'csv'
+    """
+    magic = read_sample(file, 8)
+    if magic.startswith(PARQUET_MAGIC):
+        return 'parquet'
+    if magic.startswith(XLSX_MAGIC):
+        return 'xlsx'
+    if magic.startswith(XLS_MAGIC):
+        return 'xls'
+    return 'csv'
+
+# Fonction pour convertir une valeur de cellule en texte du format d'entrée
+def cell_text(value):
+    if value is None:
+        return ''
+    # Dates (et dates-heures) en JJ/MM/AAAA, heures seules en HH:MM
+    if hasattr(value, 'year'):
+        return value.strftime('%d/%m/%Y')
+    if hasattr(value, 'hour'):
+        return value.strftime('%H:%M')
+    # Les matricules numériques sont lus comme des nombres flottants (1000.0)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+# Fonction pour regrouper les lignes d'une feuille de calcul en blocs au format d'entrée
+def iter_sheet_chunks(rows, chunksize=CHUNK_SIZE, columns=None):
+    """
+    Convertir les lignes (tuples de valeurs) d'une feuille en DataFrames de chaînes.
+    
+    La première ligne non vide est une ligne d'en-tête sauf si sa colonne Date contient
+    déjà une date. Seul un bloc de lignes est en mémoire à la fois.
+    
+    Args:
+        rows: Itérable de tuples de valeurs de cellules
+        chunksize: Nombre de lignes par bloc
+        columns: Colonnes d'entrée à convertir (par exemple ['Date']); toutes si None
+    
+    Yields:
+        DataFrames de chaînes avec les colonnes Matricule, Nom, Départment, Date, Pointages
+        (ou seulement les colonnes demandées)
+    
+    Raises:
+        InputFormatError: Si la feuille est vide ou contient moins de 5 colonnes
+    """
+    rows = (row for row in rows if any(value not in (None, '') for value in row))
+    first = next(rows, None)
+    if first is None:
+        raise InputFormatError("Le fichier d'entrée est vide")
+    first = [cell_text(value) for value in first]
+    while first and first[-1] == '':
+        first.pop()
+    if len(first) < len(INPUT_COLUMNS):
+        raise InputFormatError(f"Erreur de format: Au moins 5 colonnes attendues, {len(first)} trouvées")
+    
+    header = not is_valid_date(first[INPUT_COLUMNS.index('Date')])
+    if header:
+        names = name_input_columns(first)
+        pending = []
+    else:
+        names = INPUT_COLUMNS + [f'Extra{i}' for i in range(len(first) - len(INPUT_COLUMNS))]
+        pending = [first]
+    
+    # Seules les cellules des colonnes demandées sont converties en texte
+    positions = range(len(names)) if columns is None else sorted(names.index(column) for column in columns)
+    pending = [[row[position] for position in positions] for row in pending]
+    names = [names[position] for position in positions]
+    
+    while True:
+        batch = pending + [
+            [cell_text(row[position]) if position < len(row) else '' for position in positions]
+            for row in itertools.islice(rows, chunksize - len(pending))
+        ]
+        pending = []
+        if not batch:
+            return
+        yield pd.DataFrame(batch, columns=names)
+
+# Fonction pour lire un classeur .xlsx par blocs, en mode lecture seule
+def iter_input_xlsx(file, chunksize=CHUNK_SIZE, columns=None):
+    # Le mode lecture seule lit la première feuille ligne par ligne sans charger le classeur
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from iter_sheet_chunks(wb.worksheets[0].iter_rows(values_only=True), chunksize, columns)
+    finally:
+        wb.close()
+
+# Fonction pour lire un classeur .xls (ancien format Excel) par blocs
+def iter_input_xls(file, chunksize=CHUNK_SIZE, columns=None):
+    if xlrd is None:
+        raise InputFormatError("La lecture des fichiers .xls nécessite le paquet xlrd (pip install xlrd)")
+    if hasattr(file, 'read'):
+        book = xlrd.open_workbook(file_contents=file.read(), on_demand=True)
+    else:
+        book = xlrd.open_workbook(file, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        
+        def values(row):
+            return [
+                xlrd.xldate.xldate_as_datetime(cell.value, book.datemode) if cell.ctype == xlrd.XL_CELL_DATE else cell.value
+                for cell in row
+            ]
+        
+        yield from iter_sheet_chunks((values(row) for row in sheet.get_rows()), chunksize, columns)
+    finally:
+        book.release_resources()
+
+# Filtre des lignes d'entrée par période, département et matricule
+class InputFilter:
+    """
+    Sélection des lignes à traiter, appliquée à chaque bloc dès sa lecture.
+    
+    Les lignes écartées ne sont ni calculées ni écrites: seules les valeurs distinctes
+    des colonnes filtrées de chaque bloc sont examinées, et chaque date distincte n'est
+    analysée qu'une fois pour toute la lecture.
+    """
+    
+    def __init__(self, start=None, end=None, departments=None, matricules=None):
+        """
+        Args:
+            start: Première date retenue (incluse), ou None
+            end: Dernière date retenue (incluse), ou None
+            departments: Départements retenus (None ou vide pour tous)
+            matricules: Matricules retenus (None ou vide pour tous)
+        """
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.end = pd.Timestamp(end) if end is not None else None
+        self.departments = {str(value).strip() for value in departments} if departments else None
+        self.matricules = {str(value).strip() for value in matricules} if matricules else None
+        # Résultat du filtre de période par texte de date "JJ/MM/AAAA", conservé d'un bloc à l'autre
+        self._dates = {}
+    
+    def __bool__(self):
+        return any(value is not None for value in (self.start, self.end, self.departments, self.matricules))
+    
+    @property
+    def columns(self):
+        """Colonnes d'entrée examinées par le filtre."""
+        return [
+            column for column, active in (
+                ('Départment', self.departments is not None),
+                ('Matricule', self.matricules is not None),
+                ('Date', self.start is not None or self.end is not None)
+            ) if active
+        ]
+    
+    def __repr__(self):
+        return f"InputFilter(start={self.start}, end={self.end}, departments={self.departments}, matricules={self.matricules})"
+    
+    def apply(self, chunk):
+        """
+        Lignes retenues d'un bloc d'entrée (texte) ou de résultats relus (typés).
+        
+        Returns:
+            Le bloc inchangé si toutes ses lignes sont retenues, sinon les lignes retenues
+        """
+        keep = np.ones(len(chunk), dtype=bool)
+        for column, values in (('Départment', self.departments), ('Matricule', self.matricules)):
+            if values is not None:
+                keep &= self._isin(chunk[column], values)
+        if self.start is not None or self.end is not None:
+            # Les dates ne sont examinées que pour les lignes encore retenues
+            keep[keep] = self._date_mask(chunk['Date'][keep])
+        return chunk if keep.all() else chunk[keep]
+    
+    def _isin(self, column, values):
+        codes, uniques = pd.factorize(column)
+        allowed = np.array([str(value).strip() in values for value in uniques] + [False], dtype=bool)
+        # Les valeurs manquantes (code -1) désignent le dernier élément, toujours écarté
+        return allowed[codes]
+    
+    def _date_mask(self, dates):
+        if pd.api.types.is_datetime64_any_dtype(dates):
+            keep = dates.notna()
+            if self.start is not None:
+                keep &= dates >= self.start
+            if self.end is not None:
+                keep &= dates <= self.end
+            return keep.to_numpy()
+        
+        codes, uniques = pd.factorize(dates)
+        for value in uniques:
+            if value not in self._dates:
+                self._dates[value] = self._in_range(value)
+        allowed = np.array([self._dates[value] for value in uniques] + [False], dtype=bool)
+        return allowed[codes]
+    
+    def _in_range(self, value):
+        if not is_valid_date(value):
+            return False
+        date = datetime.strptime(value, '%d/%m/%Y')
+        return (self.start is None or date >= self.start) and (self.end is None or date <= self.end)
+
+# Fonction pour ne transmettre que les lignes retenues par le filtre (blocs vides omis)
+def filter_chunks(chunks, input_filter):
+    for chunk in chunks:
+        chunk = input_filter.apply(chunk)
+        if len(chunk):
+            yield chunk
+
+# Fonction pour lire un fichier d'entrée (CSV ou classeur Excel) par blocs
+def iter_input_file(file, chunksize=CHUNK_SIZE, input_filter=None, columns=None):
+    """
+    Avec input_filter (voir InputFilter), seules les lignes retenues sont transmises.
+    Avec columns, seules ces colonnes sont lues (les colonnes du filtre doivent en faire partie).
+    """
+    kind = detect_file_kind(file)
+    if kind == 'xlsx':
+        chunks = iter_input_xlsx(file, chunksize, columns)
+    elif kind == 'xls':
+        chunks = iter_input_xls(file, chunksize, columns)
+    else:
+        chunks = iter_input_csv(file, chunksize, columns)
+    return filter_chunks(chunks, input_filter) if input_filter else chunks
+
+# Fonction pour analyser le fichier d'entrée (CSV ou classeur Excel)
+def parse_input_csv(file, input_filter=None):
+    chunks = list(iter_input_file(file, input_filter=input_filter))
+    if not chunks:
+        return pd.DataFrame(columns=INPUT_COLUMNS)
+    
+    # Les identifiants, répétés sur de nombreuses lignes, sont stockés en catégories;
+    # Date et Pointages restent le texte d'origine (feuille des données originales)
+    return pd.concat(chunks).astype({column: 'category' for column in CATEGORY_COLUMNS})
+
+# Expression régulière équivalente à datetime.strptime(valeur, "%H:%M")
+TIME_PATTERN = r'^(2[0-3]|[0-1]\d|\d):([0-5]\d|\d)$'
+
+# Nombre de minutes dans une journée (passage de minuit)
+MINUTES_PER_DAY = 24 * 60
+
+# Table de correspondance minutes -> "HH:MM" pour toutes les minutes d'une journée
+HHMM_LOOKUP = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(MINUTES_PER_DAY)], dtype=object)
+
+# Fonction pour convertir des heures "HH:MM" en minutes depuis minuit
+def parse_minutes(values):
+    """
+    Convertir une série de chaînes "HH:MM" en minutes depuis minuit.
+    
+    Args:
+        values: Série pandas de chaînes d'heure (les valeurs manquantes sont acceptées)
+    
+    Returns:
+        Tableau numpy d'entiers; -1 pour les valeurs manquantes ou invalides
+    """
+    parts = values.astype(object).fillna('').astype(str).str.extract(TIME_PATTERN)
+    hours = pd.to_numeric(parts[0]).fillna(-1).to_numpy(dtype=np.int64)
+    minutes = pd.to_numeric(parts[1]).fillna(0).to_numpy(dtype=np.int64)
+    return np.where(hours >= 0, hours * 60 + minutes, -1)
+
+# Fonction pour formater des minutes en chaînes "HH:MM"
+def format_minutes(minutes):
+    """
+    Formater un tableau de minutes en chaînes "HH:MM" (modulo 24 heures).
+    
+    Args:
+        minutes: Tableau numpy d'entiers
+    
+    Returns:
+        Tableau numpy d'objets contenant les chaînes "HH:MM"
+    """
+    return HHMM_LOOKUP[np.asarray(minutes, dtype=np.int64) % MINUTES_PER_DAY]
+
+# Limites de l'horaire de travail par défaut (minutes depuis minuit), calculées une seule fois
+MORNING_START = 9 * 60
+LUNCH_START = 13 * 60
+LUNCH_END = 15 * 60
+DAY_END = 18 * 60
+
+# Horaire par défaut: limites de la journée et de la pause, heures attendues (HL) et pause standard (H.P)
+DEFAULT_SCHEDULE = {
+    'Début': MORNING_START,
+    'Début pause': LUNCH_START,
+    'Fin pause': LUNCH_END,
+    'Fin': DAY_END,
+    'HL': 8 * 60,
+    'H.P': 60
+}
+
+# Écart maximal (en minutes) entre deux pointages considérés comme un doublon
+DUPLICATE_WINDOW = 5
+
+# Nombre de pointages d'une journée complète: entrée, début pause, fin pause, sortie
+FULL_DAY_PUNCHES = 4
+
+# Fonction pour supprimer, ligne par ligne, les candidats de plus forte priorité
+def drop_surplus(keep, candidates, priority, limit):
+    """
+    Retirer au plus `limit` candidats par ligne, par ordre de priorité décroissante.
+    
+    Args:
+        keep: Tableau booléen (lignes x pointages) des pointages conservés
+        candidates: Tableau booléen des pointages pouvant être supprimés
+        priority: Tableau de priorités de suppression (à égalité, les derniers sont supprimés)
+        limit: Nombre maximal de suppressions par ligne
+    
+    Returns:
+        Nouveau tableau keep
+    """
+    score = np.where(candidates, priority, -np.inf)
+    columns = np.broadcast_to(np.arange(keep.shape[1]), keep.shape)
+    order = np.lexsort((-columns, -score), axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, columns, axis=1)
+    return keep & ~(candidates & (ranks < np.maximum(limit, 0)[:, None]))
+
+# Fonction pour normaliser un lot de pointages représentés en minutes
+def normalize_punch_batch(punches, counts, schedule=None):
+    """
+    Normaliser un lot de lignes de pointage vers le format standard de 4 valeurs.
+    
+    Les règles sont appliquées à toutes les lignes à la fois, pour n'importe quel
+    nombre de pointages (horaires par défaut entre parenthèses):
+    1. Les doublons (à moins de 5 minutes du pointage conservé précédent) sont supprimés,
+       dans l'ordre, tant qu'il reste plus de 4 pointages.
+    2. S'il reste plus de 4 pointages et au moins 3 dans la pause (13:00-15:00),
+       seuls le premier et le dernier pointage de la pause sont conservés.
+    3. S'il reste plus de 4 pointages, les entrées matinales (avant la pause) les plus
+       éloignées du début de journée (09:00) sont supprimées, puis les sorties du soir
+       (après la pause) les plus éloignées de la fin de journée (18:00), en gardant au
+       moins une entrée et une sortie. Le pointage qui sert de début ou de fin de pause
+       lorsque la pause compte moins de 2 pointages n'est pas candidat.
+    4. En dernier recours, les deux premiers et les deux derniers pointages sont gardés.
+    
+    Aucune règle ne supprime plus de pointages que le surplus au-delà de 4: une ligne de
+    5 pointages donne 4 pointages. La version ligne par ligne d'origine pouvait en laisser
+    moins (plusieurs entrées matinales ou sorties du soir, ligne alors irrégulière) ou
+    échouer, et supprimait parfois le début ou la fin de pause: le résultat diffère alors.
+    
+    Args:
+        punches: Tableau d'entiers (lignes x pointages) de minutes depuis minuit;
+            les cases au-delà du nombre de pointages de la ligne sont ignorées
+        counts: Tableau du nombre de pointages par ligne
+        schedule: Dictionnaire optionnel des limites de l'horaire ('Début', 'Début pause',
+            'Fin pause', 'Fin'), chacune en minutes pour tout le lot ou par ligne
+            (voir ScheduleTable); DEFAULT_SCHEDULE par défaut
+    
+    Returns:
+        Tuple (pointages normalisés tassés à gauche avec -1 pour les cases vides,
+        nombre de pointages par ligne)
+    """
+    schedule = schedule or DEFAULT_SCHEDULE
+    # Limites par ligne sous forme de colonnes, pour s'aligner sur les pointages (lignes x pointages)
+    morning_start, lunch_start, lunch_end, day_end = (
+        np.asarray(schedule[field]).reshape(-1, 1) if np.ndim(schedule[field]) else schedule[field]
+        for field in ['Début', 'Début pause', 'Fin pause', 'Fin']
+    )
+    n_rows, width = punches.shape
+    columns = np.arange(width)[None, :]
+    keep = columns < np.asarray(counts)[:, None]
+    
+    # Règle 1: supprimer les doublons (garder le premier), au plus le surplus au-delà de 4
+    allowed = np.asarray(counts) - FULL_DAY_PUNCHES
+    dropped = np.zeros(n_rows, dtype=np.int64)
+    last_kept = np.full(n_rows, -DUPLICATE_WINDOW - 1)
+    for j in range(width):
+        duplicate = keep[:, j] & (np.abs(punches[:, j] - last_kept) <= DUPLICATE_WINDOW) & (dropped < allowed)
+        keep[:, j] &= ~duplicate
+        dropped += duplicate
+        last_kept = np.where(keep[:, j], punches[:, j], last_kept)
+    
+    def surplus():
+        return keep.sum(axis=1) - FULL_DAY_PUNCHES
+    
+    # Règle 2: garder les première et dernière heures de la pause
+    in_lunch = keep & (punches >= lunch_start) & (punches <= lunch_end)
+    lunch_count = in_lunch.sum(axis=1)
+    first_lunch = np.argmax(in_lunch, axis=1)
+    last_lunch = width - 1 - np.argmax(in_lunch[:, ::-1], axis=1)
+    middle = in_lunch & (columns > first_lunch[:, None]) & (columns < last_lunch[:, None])
+    keep = drop_surplus(keep, middle, np.zeros(punches.shape), np.where(lunch_count >= 3, surplus(), 0))
+    
+    # Règle 3: entrée la plus proche de 09:00, sortie la plus proche de 18:00
+    # Sans pointage de pause, la dernière entrée matinale et la première sortie du soir
+    # servent de début et de fin de pause; avec un seul, la dernière entrée matinale
+    lunch_count = (keep & (punches >= lunch_start) & (punches <= lunch_end)).sum(axis=1)[:, None]
+    morning = keep & (punches < lunch_start)
+    last_morning = width - 1 - np.argmax(morning[:, ::-1], axis=1)
+    morning &= ~((lunch_count < 2) & (columns == last_morning[:, None]))
+    keep = drop_surplus(keep, morning, np.abs(punches - morning_start), np.minimum(surplus(), morning.sum(axis=1) - 1))
+    
+    evening = keep & (punches > lunch_end)
+    first_evening = np.argmax(evening, axis=1)
+    evening &= ~((lunch_count == 0) & (columns == first_evening[:, None]))
+    keep = drop_surplus(keep, evening, np.abs(punches - day_end), np.minimum(surplus(), evening.sum(axis=1) - 1))
+    
+    # Règle 4: garder les deux premiers et les deux derniers pointages
+    kept_rank = np.cumsum(keep, axis=1) - 1
+    kept_total = keep.sum(axis=1)[:, None]
+    keep &= ~((kept_rank >= 2) & (kept_rank < kept_total - 2))
+    
+    # Tasser les pointages conservés à gauche en préservant leur ordre
+    order = np.argsort(~keep, axis=1, kind='stable')
+    packed = np.take_along_axis(np.where(keep, punches, -1), order, axis=1)
+    return packed, keep.sum(axis=1)
+
+# Fonction pour normaliser une liste de pointages
+def normalize_pointage(pointages):
+    """
+    Normaliser une liste de pointages au format standard de 4 valeurs.
+    
+    Args:
+        pointages: Liste de chaînes d'heure au format "HH:MM"
+    
+    Returns:
+        Liste de chaînes d'heure normalisée (voir normalize_punch_batch); la liste est
+        retournée telle quelle si elle a déjà 0, 2 ou 4 valeurs ou contient une heure invalide
+    """
+    if len(pointages) in (0, 2, FULL_DAY_PUNCHES):
+        return pointages  # Déjà au format correct
+    
+    minutes = parse_minutes(pd.Series(pointages, dtype=object))
+    if (minutes < 0).any():
+        return pointages  # Ne peut pas interpréter les heures, retourner tel quel
+    
+    packed, counts = normalize_punch_batch(minutes[None, :], np.array([len(pointages)]))
+    return list(format_minutes(packed[0, :counts[0]]))
+
+# Fonction pour vérifier une date au format JJ/MM/AAAA
+def is_valid_date(value):
+    try:
+        datetime.strptime(value, '%d/%m/%Y')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+# Fonction pour ajouter un message aux observations existantes
+def append_observation(observations, mask, message):
+    """
+    Ajouter un message aux observations des lignes sélectionnées, séparé par " | ".
+    
+    Args:
+        observations: Tableau numpy d'objets contenant les observations actuelles
+        mask: Tableau booléen des lignes concernées
+        message: Chaîne ou tableau de chaînes à ajouter
+    
+    Returns:
+        Nouveau tableau d'observations
+    """
+    combined = np.where(observations != '', observations + ' | ' + message, message)
+    return np.where(mask, combined, observations)
+
+# Colonnes produites par process_time_entries
+PROCESSED_COLUMNS = [
+    'Matricule', 'Nom', 'Départment', 'Date', 'Entrée', 'Sortie',
+    'Début Pause', 'Fin Pause', 'Temps de pause', 'H.P', 'H. Tr', 'HL',
+    'Heures perdues', 'Heures supp', 'Observations'
+]
+
+# Colonnes d'identifiants (catégories), d'heures pointées (minutes depuis minuit) et de durées (minutes)
+CATEGORY_COLUMNS = ['Matricule', 'Nom', 'Départment']
+CLOCK_COLUMNS = ['Entrée', 'Sortie', 'Début Pause', 'Fin Pause']
+DURATION_COLUMNS = ['Temps de pause', 'H.P', 'H. Tr', 'HL', 'Heures perdues', 'Heures supp']
+MINUTE_COLUMNS = CLOCK_COLUMNS + DURATION_COLUMNS
+
+# Types des colonnes produites par process_time_entries (valeur vide: NaT ou <NA>)
+PROCESSED_DTYPES = {
+    **{column: 'category' for column in CATEGORY_COLUMNS},
+    'Date': 'datetime64[ns]',
+    **{column: 'Int16' for column in MINUTE_COLUMNS},
+    'Observations': str
+}
+
+# Fonction pour créer un résultat vide avec les types du traitement
+def empty_processed():
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in PROCESSED_DTYPES.items()})
+
+# Fonction pour convertir un tableau de minutes (-1 pour une valeur vide) en colonne entière nullable
+def minutes_array(minutes):
+    minutes = np.asarray(minutes)
+    return pd.arrays.IntegerArray(minutes.astype(np.int16), minutes < 0)
+
+# Fonction pour extraire les minutes d'une colonne entière nullable (-1 pour une valeur vide)
+def minute_values(column):
+    return pd.Series(column).fillna(-1).to_numpy(dtype=np.int64)
+
+# Fonction pour formater une colonne de minutes en "HH:MM" (chaîne vide pour une valeur vide)
+def format_minute_column(column):
+    minutes = minute_values(column)
+    return np.where(minutes >= 0, format_minutes(minutes), '')
+
+# Fonction pour convertir des dates "JJ/MM/AAAA" en dates réelles
+def parse_dates(values):
+    """
+    Convertir une série de dates "JJ/MM/AAAA" en dates (datetime64).
+    
+    Chaque date distincte n'est analysée qu'une fois; les dates invalides donnent NaT.
+    """
+    mapping = {
+        d: datetime.strptime(d, '%d/%m/%Y') if is_valid_date(d) else None
+        for d in pd.unique(values)
+    }
+    return pd.to_datetime(pd.Series(values).map(mapping))
+
+# Fonction pour formater les colonnes typées du traitement en texte
+def format_processed(df):
+    """
+    Formater les dates en "JJ/MM/AAAA" et les minutes en "HH:MM" (cumuls au-delà de 24 heures
+    compris). Seule l'écriture du rapport et l'affichage ont besoin de cette forme texte.
+    
+    Args:
+        df: DataFrame produit par process_time_entries ou add_running_totals
+    
+    Returns:
+        Copie du DataFrame avec les colonnes de date et de durée en texte
+    """
+    text = df.copy()
+    text['Date'] = pd.to_datetime(df['Date']).dt.strftime('%d/%m/%Y').fillna('').to_numpy(dtype=object)
+    for column in MINUTE_COLUMNS:
+        text[column] = format_minute_column(df[column])
+    for column in CUMULATIVE_COLUMNS:
+        if column in df:
+            text[column] = format_duration(df[column])
+    return text
+
+# Fonction pour reconvertir un résultat au format texte dans les types du traitement
+def parse_processed(text):
+    """
+    Convertir un DataFrame texte (dates "JJ/MM/AAAA", durées "HH:MM") dans les types de
+    PROCESSED_DTYPES; les valeurs vides ou invalides deviennent nulles.
+    """
+    typed = pd.DataFrame({column: text[column].astype(str).to_numpy() for column in CATEGORY_COLUMNS}).astype('category')
+    typed['Date'] = parse_dates(text['Date']).to_numpy(dtype='datetime64[ns]')
+    for column in MINUTE_COLUMNS:
+        typed[column] = minutes_array(parse_minutes(text[column]))
+    typed['Observations'] = text['Observations'].astype(object).fillna('').to_numpy()
+    return typed[PROCESSED_COLUMNS].astype(PROCESSED_DTYPES)
+
+# Champs d'un horaire de travail (minutes), dans l'ordre des colonnes du fichier d'horaires
+SCHEDULE_FIELDS = list(DEFAULT_SCHEDULE)
+
+# Colonnes de sélection d'une règle d'horaire (vide: toutes les valeurs)
+SCHEDULE_KEYS = ['Matricule', 'Départment', 'Jour']
+
+# Jours de la semaine, dans l'ordre de Timestamp.dayofweek
+WEEKDAYS = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']
+
+# Fonction pour convertir un jour de la semaine (nom ou numéro de 1 à 7) en numéro depuis lundi
+def parse_weekday(value):
+    """
+    Returns:
+        Entier de 0 (lundi) à 6 (dimanche), ou None si la valeur est vide ou invalide
+    """
+    value = value.strip().lower()
+    if value in WEEKDAYS:
+        return WEEKDAYS.index(value)
+    if value.isdigit() and 1 <= int(value) <= 7:
+        return int(value) - 1
+    return None
+
+# Horaires de travail compilés en index de recherche
+class ScheduleTable:
+    """
+    Horaires de travail par Matricule, Départment et jour de la semaine.
+    
+    Chaque règle fixe tout ou partie des champs de SCHEDULE_FIELDS; les champs vides
+    prennent la valeur de DEFAULT_SCHEDULE. Pour une ligne, la règle la plus spécifique
+    s'applique: une règle par Matricule l'emporte sur une règle par Départment, qui
+    l'emporte sur une règle générale; à niveau égal, une règle limitée à un jour
+    l'emporte. L'horaire 0 est l'horaire par défaut.
+    
+    Les règles sont compilées une fois: values contient un tableau par champ (une case
+    par horaire) et chaque combinaison de colonnes renseignées a son index de recherche.
+    """
+    
+    def __init__(self, rules=None):
+        """
+        Args:
+            rules: DataFrame optionnel de chaînes avec des colonnes parmi SCHEDULE_KEYS et
+                SCHEDULE_FIELDS (heures "HH:MM"; Jour en toutes lettres ou de 1 à 7)
+        
+        Raises:
+            InputFormatError: Si une heure ou un jour est invalide, ou si deux règles
+                portent sur les mêmes Matricule, Départment et jour
+        """
+        rules = pd.DataFrame() if rules is None else rules.astype(object).fillna('').astype(str)
+        rules = rules.apply(lambda column: column.str.strip()).reindex(columns=SCHEDULE_KEYS + SCHEDULE_FIELDS, fill_value='')
+        
+        self.values = {}
+        for field in SCHEDULE_FIELDS:
+            minutes = parse_minutes(rules[field]) if len(rules) else np.array([], dtype=np.int64)
+            invalid = (minutes < 0) & (rules[field] != '').to_numpy()
+            if invalid.any():
+                raise InputFormatError(f"Horaires: valeur invalide pour {field}: {rules[field][invalid].iloc[0]}")
+            self.values[field] = np.concatenate([[DEFAULT_SCHEDULE[field]], np.where(minutes >= 0, minutes, DEFAULT_SCHEDULE[field])])
+        
+        for day in rules.loc[rules['Jour'] != '', 'Jour']:
+            if parse_weekday(day) is None:
+                raise InputFormatError(f"Horaires: jour invalide: {day} (attendu: {', '.join(WEEKDAYS)} ou 1 à 7)")
+        rules['Jour'] = rules['Jour'].map(parse_weekday).astype(object)
+        
+        # Un index par combinaison de colonnes renseignées, de la plus spécifique à la plus générale
+        specified = pd.DataFrame({
+            'Matricule': rules['Matricule'] != '',
+            'Départment': rules['Départment'] != '',
+            'Jour': rules['Jour'].notna()
+        })
+        self._levels = []
+        for pattern, group in specified.groupby(SCHEDULE_KEYS, sort=False).groups.items():
+            keys = [key for key, present in zip(SCHEDULE_KEYS, pattern) if present]
+            # Une règle sans Matricule, Départment ni jour remplace l'horaire par défaut
+            index = pd.MultiIndex.from_frame(rules.loc[group, keys]) if keys else None
+            duplicated = index.duplicated() if keys else np.arange(len(group)) > 0
+            if duplicated.any():
+                target = ', '.join(map(str, index[duplicated][0])) if keys else 'toutes les lignes'
+                raise InputFormatError(f"Horaires: plusieurs règles pour {target}")
+            rank = 4 * pattern[0] + 2 * pattern[1] + pattern[2]
+            self._levels.append((rank, keys, index, np.asarray(group) + 1))
+        self._levels.sort(key=lambda level: -level[0])
+    
+    def __len__(self):
+        return len(self.values['HL'])
+    
+    def lookup(self, df, dates):
+        """
+        Horaire applicable à chaque ligne.
+        
+        Les combinaisons distinctes (Matricule, Départment, jour) sont résolues une fois,
+        puis les horaires sont reportés sur les lignes.
+        
+        Args:
+            df: DataFrame avec les colonnes Matricule et Départment
+            dates: Série de dates (datetime64) alignée sur df
+        
+        Returns:
+            Tableau d'entiers: position de l'horaire de chaque ligne dans values
+        """
+        if not self._levels:
+            return np.zeros(len(df), dtype=np.int64)
+        
+        # Clé entière par combinaison (Matricule, Départment, jour) à partir des codes de chaque colonne
+        matricule_codes, matricules = pd.factorize(df['Matricule'].astype(str))
+        department_codes, departments = pd.factorize(df['Départment'].astype(str))
+        weekdays = pd.DatetimeIndex(dates).dayofweek.to_numpy().astype(np.int64)
+        codes, combos = pd.factorize((matricule_codes.astype(np.int64) * len(departments) + department_codes) * 7 + weekdays)
+        uniques = pd.DataFrame({
+            'Matricule': matricules[combos // 7 // len(departments)],
+            'Départment': departments[combos // 7 % len(departments)],
+            'Jour': combos % 7
+        })
+        
+        ids = np.zeros(len(uniques), dtype=np.int64)
+        resolved = np.zeros(len(uniques), dtype=bool)
+        for _, keys, index, rule_ids in self._levels:
+            if keys:
+                found = index.get_indexer(pd.MultiIndex.from_frame(uniques[keys]))
+            else:
+                found = np.zeros(len(uniques), dtype=np.int64)
+            match = ~resolved & (found >= 0)
+            ids[match] = rule_ids[found[match]]
+            resolved |= match
+        return ids[codes]
+
+# Fonction pour charger un fichier d'horaires (CSV)
+def load_schedules(file):
+    """
+    Charger et compiler les horaires de travail d'un fichier CSV.
+    
+    Le fichier a une ligne d'en-tête avec des colonnes parmi Matricule, Départment, Jour,
+    Début, Début pause, Fin pause, Fin, HL et H.P; l'encodage et le séparateur sont
+    détectés comme pour les fichiers d'entrée.
+    
+    Returns:
+        ScheduleTable
+    
+    Raises:
+        InputFormatError: Si le fichier ou une règle est invalide (voir ScheduleTable)
+    """
+    sample = read_sample(file)
+    encoding = sniff_encoding(sample)
+    header = sample.decode(encoding, errors='replace').splitlines()[0] if sample.strip() else ''
+    delimiter = next((d for d in DELIMITERS if d in header), ';')
+    try:
+        rules = pd.read_csv(file, sep=delimiter, dtype=str, keep_default_na=False, encoding=encoding)
+    except (UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise InputFormatError(f"Horaires: fichier illisible ({e})")
+    unknown = set(rules.columns) - set(SCHEDULE_KEYS + SCHEDULE_FIELDS)
+    if unknown:
+        raise InputFormatError(f"Horaires: colonnes inconnues: {', '.join(sorted(unknown))}")
+    return ScheduleTable(rules)
+
+# Fonction pour calculer les résultats d'une série de chaînes de pointages
+def evaluate_punches(pointages_str, schedule=None):
+    """
+    Calculer les heures et les observations de chaque chaîne de pointages, en une
+    seule passe vectorisée.
+    
+    Les pointages sont découpés en tableaux de minutes depuis minuit, puis l'entrée,
+    la sortie, la pause, les heures travaillées, perdues et supplémentaires sont
+    calculées colonne par colonne, y compris le passage de minuit.
+    
+    Args:
+        pointages_str: Série de chaînes de pointages (index 0..n-1), de préférence distinctes
+        schedule: Dictionnaire {champ: minutes} de l'horaire (voir DEFAULT_SCHEDULE), chaque
+            valeur commune à toutes les chaînes ou donnée par chaîne (tableau)
+    
+    Returns:
+        Dictionnaire {colonne: tableau numpy} pour MINUTE_COLUMNS (-1 pour une case vide)
+        et Observations
+    """
+    schedule = schedule or DEFAULT_SCHEDULE
+    h_p_minutes = schedule['H.P']
+    h_l_minutes = schedule['HL']
+    
+    # Découper les pointages en colonnes (une colonne par heure pointée)
+    tokens = pointages_str.str.split(expand=True)
+    tokens = tokens.reindex(columns=range(max(5, tokens.shape[1]))).astype(object)
+    counts = tokens.notna().sum(axis=1).to_numpy().copy()
+    
+    observations = np.full(len(pointages_str), '', dtype=object)
+    
+    # Normaliser les pointages irréguliers (3 valeurs ou plus de 4) par lot
+    to_normalize = (counts == 3) | (counts > FULL_DAY_PUNCHES)
+    if to_normalize.any():
+        width = tokens.shape[1]
+        subset = tokens.loc[to_normalize]
+        subset_counts = counts[to_normalize]
+        punches = np.column_stack([parse_minutes(subset[j]) for j in range(width)])
+        
+        # Les lignes contenant une heure invalide ne sont pas normalisées
+        present = np.arange(width)[None, :] < subset_counts[:, None]
+        parsable = ~(present & (punches < 0)).any(axis=1)
+        subset_schedule = {field: value[to_normalize] if np.ndim(value) else value for field, value in schedule.items()}
+        packed, new_counts = normalize_punch_batch(punches, np.where(parsable, subset_counts, 0), subset_schedule)
+        new_counts = np.where(parsable, new_counts, subset_counts)
+        
+        # Marquer pour vérification les lignes de plus de 4 valeurs et celles modifiées
+        flagged = (subset_counts > FULL_DAY_PUNCHES) | (new_counts != subset_counts)
+        flagged_rows = np.flatnonzero(to_normalize)[flagged]
+        original_pointage = pointages_str.iloc[flagged_rows].str.split().str.join(' ').to_numpy(dtype=object)
+        original_counts = subset_counts[flagged].astype(str).astype(object)
+        observations[flagged_rows] = "À VÉRIFIER: Original avait " + original_counts + " valeurs: " + original_pointage
+        
+        normalized = np.where(packed >= 0, format_minutes(packed), None)
+        changed_rows = np.flatnonzero(to_normalize)[parsable]
+        tokens.iloc[changed_rows, :] = normalized[parsable]
+        counts[changed_rows] = new_counts[parsable]
+    
+    four = counts == 4
+    two = counts == 2
+    absent = counts == 0
+    irregular = ~(four | two | absent)
+    
+    # Convertir les quatre premières heures en minutes depuis minuit
+    punches = np.column_stack([parse_minutes(tokens[i]) for i in range(4)])
+    
+    # Entrée/sortie: (0, 3) pour 4 pointages, (0, 1) pour 2 pointages
+    entry_minutes = punches[:, 0]
+    exit_minutes = np.where(four, punches[:, 3], punches[:, 1])
+    
+    # Temps de pause (pointages 2 et 3 pour les données complètes)
+    pause_ok = four & (punches[:, 1] >= 0) & (punches[:, 2] >= 0)
+    pause_delta = punches[:, 2] - punches[:, 1]
+    pause_delta = np.where(pause_delta > 0, pause_delta, pause_delta + MINUTES_PER_DAY) % MINUTES_PER_DAY
+    
+    # Heures de travail, avec passage de minuit et pause déduite (pause standard si absente)
+    work_ok = (four & pause_ok | two) & (entry_minutes >= 0) & (exit_minutes >= 0)
+    work_delta = exit_minutes - entry_minutes
+    work_delta = np.where(work_delta > 0, work_delta, work_delta + MINUTES_PER_DAY)
+    work_delta = (work_delta - np.where(four, pause_delta, h_p_minutes)) % MINUTES_PER_DAY
+    
+    # Minutes de chaque colonne (-1 pour une case vide); 00:00 pour les absents
+    empty = np.full(len(pointages_str), -1)
+    zero = np.zeros(len(pointages_str), dtype=np.int64)
+    
+    entree = np.where(four | two, punches[:, 0], np.where(absent, zero, empty))
+    sortie = np.where(four, punches[:, 3], np.where(two, punches[:, 1], np.where(absent, zero, empty)))
+    debut_pause = np.where(four, punches[:, 1], empty)
+    fin_pause = np.where(four, punches[:, 2], empty)
+    temps_pause = np.where(pause_ok, pause_delta, zero)
+    h_tr = np.where(work_ok, work_delta, np.where(absent, zero, empty))
+    heures_perdues = np.where(work_ok & (work_delta < h_l_minutes), h_l_minutes - work_delta, empty)
+    heures_supp = np.where(work_ok & (work_delta > h_l_minutes), work_delta - h_l_minutes, empty)
+    
+    # Observations
+    observations = append_observation(observations, two, "Données de pause manquantes")
+    # Les heures illisibles ne peuvent pas être conservées en minutes: les pointages d'origine sont cités
+    error = (four | two) & ~work_ok
+    error_message = np.full(len(pointages_str), "Erreur dans les calculs de temps", dtype=object)
+    if error.any():
+        error_message[error] += ": " + pointages_str[error].str.split().str.join(' ').to_numpy(dtype=object)
+    observations = append_observation(observations, error, error_message)
+    observations = append_observation(observations, absent, "Absent")
+    irregular_message = "Données irrégulières: " + counts.astype(str).astype(object) + " valeurs"
+    observations = append_observation(observations, irregular, irregular_message)
+    
+    return {
+        'Entrée': entree,
+        'Sortie': sortie,
+        'Début Pause': debut_pause,
+        'Fin Pause': fin_pause,
+        'Temps de pause': temps_pause,
+        'H.P': np.broadcast_to(h_p_minutes, len(pointages_str)),
+        'H. Tr': h_tr,
+        'HL': np.broadcast_to(h_l_minutes, len(pointages_str)),
+        'Heures perdues': heures_perdues,
+        'Heures supp': heures_supp,
+        'Observations': observations
+    }
+
+# Horaires sans règle: l'horaire par défaut s'applique à toutes les lignes
+DEFAULT_SCHEDULE_TABLE = ScheduleTable()
+
+# Fonction pour traiter les entrées de temps
+def process_time_entries(df, schedules=None):
+    """
+    Calculer les heures de travail de toutes les lignes en une seule passe vectorisée.
+    
+    Les mêmes chaînes de pointages se répètent d'un employé et d'un jour à l'autre:
+    chaque couple distinct (chaîne de pointages, horaire) n'est évalué qu'une fois
+    (voir evaluate_punches) et chaque date distincte n'est analysée qu'une fois, puis
+    les résultats sont reportés sur les lignes.
+    
+    Args:
+        df: DataFrame d'entrée avec les colonnes Matricule, Nom, Départment, Date, Pointages
+        schedules: ScheduleTable optionnel des horaires par Matricule, Départment et jour
+            de la semaine (horaire par défaut pour toutes les lignes sinon)
+    
+    Returns:
+        DataFrame avec une ligne par entrée ayant une date valide: identifiants en
+        catégories, date réelle, heures et durées en minutes (voir PROCESSED_DTYPES)
+    """
+    # Ignorer les lignes avec des dates invalides (chaque date distincte n'est analysée qu'une fois)
+    dates = parse_dates(df['Date'])
+    valid = dates.notna().to_numpy()
+    df = df[valid].reset_index(drop=True)
+    dates = dates[valid].reset_index(drop=True)
+    if df.empty:
+        return empty_processed()
+    
+    pointages_str = df['Pointages'].astype(object).fillna('').astype(str).replace('nan', '')
+    
+    # Horaire applicable à chaque ligne, résolu par l'index compilé
+    schedules = schedules or DEFAULT_SCHEDULE_TABLE
+    schedule_ids = schedules.lookup(df, dates)
+    
+    # Évaluer chaque couple distinct (chaîne de pointages, horaire), puis reporter les résultats sur les lignes
+    punch_codes, unique_pointages = pd.factorize(pointages_str)
+    codes, unique_keys = pd.factorize(punch_codes.astype(np.int64) * len(schedules) + schedule_ids)
+    unique_schedules = unique_keys % len(schedules)
+    results = evaluate_punches(
+        pd.Series(unique_pointages[unique_keys // len(schedules)]),
+        {field: schedules.values[field][unique_schedules] for field in SCHEDULE_FIELDS}
+    )
+    results = {column: values[codes] for column, values in results.items()}
+    
+    return pd.DataFrame({
+        'Matricule': pd.Categorical(df['Matricule'].astype(str)),
+        'Nom': pd.Categorical(df['Nom'].astype(str)),
+        'Départment': pd.Categorical(df['Départment'].astype(str)),
+        'Date': dates.to_numpy(dtype='datetime64[ns]'),
+        **{column: minutes_array(results[column]) for column in MINUTE_COLUMNS},
+        'Observations': results['Observations']
+    }, columns=PROCESSED_COLUMNS)
+
+# Colonnes de la feuille "Etat de pointage", dans l'ordre des en-têtes du rapport
+REPORT_COLUMNS = PROCESSED_COLUMNS[:-1] + ['Cumul HP', 'Cumul HS', 'TOTAL HP', 'Observations']
+
+# Colonnes de cumul (minutes, pouvant dépasser 24 heures)
+CUMULATIVE_COLUMNS = ['Cumul HP', 'Cumul HS', 'TOTAL HP']
+
+# Fonction pour formater des durées cumulées (pouvant dépasser 24 heures)
+def format_duration(minutes):
+    minutes = pd.Series(np.asarray(minutes, dtype=np.int64))
+    return ((minutes // 60).astype(str).str.zfill(2) + ':' + (minutes % 60).astype(str).str.zfill(2)).to_numpy(dtype=object)
+
+# Fonction pour calculer les cumuls par employé
+def add_running_totals(df, carry=None):
+    """
+    Calculer les colonnes Cumul HP, Cumul HS et TOTAL HP par somme cumulée groupée.
+    
+    Les lignes sont triées explicitement par Matricule puis par Date, de sorte que les
+    cumuls ne dépendent pas de l'ordre des lignes dans l'export.
+    
+    Args:
+        df: DataFrame produit par process_time_entries
+        carry: Dictionnaire optionnel {matricule: (minutes_hp, minutes_hs)} des totaux
+            des blocs précédents; mis à jour sur place avec les totaux de ce bloc
+    
+    Returns:
+        DataFrame trié avec les colonnes de cumul ajoutées (en minutes)
+    """
+    df = df.sort_values(['Matricule', 'Date'], kind='mergesort').reset_index(drop=True)
+    
+    # Heures perdues et supplémentaires en minutes (0 si absentes)
+    lost = np.maximum(minute_values(df['Heures perdues']), 0)
+    extra = np.maximum(minute_values(df['Heures supp']), 0)
+    
+    matricules = df['Matricule'].astype(str)
+    cumul_hp = pd.Series(lost).groupby(matricules, dropna=False, sort=False).cumsum().to_numpy()
+    cumul_hs = pd.Series(extra).groupby(matricules, dropna=False, sort=False).cumsum().to_numpy()
+    
+    # Reporter les totaux des blocs précédents
+    if carry is not None:
+        if carry:
+            previous = pd.DataFrame.from_dict(carry, orient='index', columns=['hp', 'hs'])
+            offsets = previous.reindex(matricules.to_numpy()).fillna(0).to_numpy(dtype=np.int64)
+            cumul_hp = cumul_hp + offsets[:, 0]
+            cumul_hs = cumul_hs + offsets[:, 1]
+        last = pd.DataFrame({'hp': cumul_hp, 'hs': cumul_hs}).groupby(matricules, dropna=False, sort=False).last()
+        carry.update(zip(last.index, zip(last['hp'].tolist(), last['hs'].tolist())))
+    
+    df['Cumul HP'] = cumul_hp
+    df['Cumul HS'] = cumul_hs
+    # Le total HP reprend le cumul HP (ce serait une décision de logique métier)
+    df['TOTAL HP'] = cumul_hp
+    
+    return df
+
+# Colonnes de la synthèse par employé et par département (durées en minutes, puis nombres de lignes)
+SUMMARY_COLUMNS = ['Jours', 'Heures travaillées', 'Heures perdues', 'Heures supp', 'Absences', 'À vérifier', 'Pointages irréguliers']
+SUMMARY_DURATION_COLUMNS = ['Heures travaillées', 'Heures perdues', 'Heures supp']
+
+# Fonction pour calculer les totaux d'un bloc par (Matricule, Nom, Départment)
+def summary_totals(df):
+    """
+    Totaux de SUMMARY_COLUMNS en un seul regroupement sur le bloc.
+    
+    Les pointages irréguliers sont les lignes normalisées ("À VÉRIFIER") et celles
+    restées irrégulières ("Données irrégulières").
+    """
+    observations = df['Observations'].astype(str)
+    review = observations.str.contains('À VÉRIFIER', regex=False).to_numpy()
+    irregular = review | observations.str.contains('Données irrégulières', regex=False).to_numpy()
+    return pd.DataFrame({
+        'Matricule': df['Matricule'].astype(str).to_numpy(),
+        'Nom': df['Nom'].astype(str).to_numpy(),
+        'Départment': df['Départment'].astype(str).to_numpy(),
+        'Jours': np.ones(len(df), dtype=np.int64),
+        'Heures travaillées': np.maximum(minute_values(df['H. Tr']), 0),
+        'Heures perdues': np.maximum(minute_values(df['Heures perdues']), 0),
+        'Heures supp': np.maximum(minute_values(df['Heures supp']), 0),
+        'Absences': observations.str.contains('Absent', regex=False).to_numpy().astype(np.int64),
+        'À vérifier': review.astype(np.int64),
+        'Pointages irréguliers': irregular.astype(np.int64)
+    }).groupby(['Matricule', 'Nom', 'Départment'], sort=False).sum()
+
+# Synthèse par employé et par département, cumulée bloc par bloc
+class SummaryAccumulator:
+    """
+    Totaux par employé et par département, mis à jour à chaque bloc traité.
+    
+    Seuls les totaux par (Matricule, Nom, Départment) sont conservés entre les blocs,
+    de sorte que la mémoire utilisée dépend du nombre d'employés et non du nombre de lignes.
+    """
+    
+    def __init__(self):
+        self._totals = None
+    
+    def add(self, df):
+        if df.empty:
+            return
+        totals = summary_totals(df)
+        if self._totals is not None:
+            totals = pd.concat([self._totals, totals]).groupby(level=[0, 1, 2], sort=False).sum()
+        self._totals = totals
+    
+    def result(self):
+        """
+        Returns:
+            Dictionnaire {'Matricule': synthèse par employé, 'Départment': synthèse par
+            département}; durées en minutes (voir format_summary)
+        """
+        if self._totals is None:
+            return {
+                'Matricule': pd.DataFrame(columns=['Matricule', 'Nom', 'Départment'] + SUMMARY_COLUMNS),
+                'Départment': pd.DataFrame(columns=['Départment', 'Employés'] + SUMMARY_COLUMNS)
+            }
+        totals = self._totals.reset_index()
+        sums = {column: (column, 'sum') for column in SUMMARY_COLUMNS}
+        employees = totals.groupby('Matricule', sort=True).agg(
+            Nom=('Nom', 'first'),
+            Départment=('Départment', lambda values: ', '.join(sorted(set(values)))),
+            **sums
+        ).reset_index()
+        departments = totals.groupby('Départment', sort=True).agg(
+            Employés=('Matricule', 'nunique'),
+            **sums
+        ).reset_index()
+        return {'Matricule': employees, 'Départment': departments}
+
+# Fonction pour formater les durées d'une synthèse en "HH:MM" (au-delà de 24 heures compris)
+def format_summary(summary):
+    text = summary.copy()
+    for column in SUMMARY_DURATION_COLUMNS:
+        text[column] = format_duration(summary[column])
+    return text
+
+# Fonction pour traiter le fichier CSV d'entrée bloc par bloc
+def process_csv_in_chunks(file, chunksize=CHUNK_SIZE, schedules=None, input_filter=None):
+    """
+    Lire et traiter le fichier CSV d'entrée bloc par bloc.
+    
+    Args:
+        file: Chemin ou objet fichier du CSV
+        chunksize: Nombre de lignes par bloc
+        schedules: ScheduleTable optionnel (voir process_time_entries)
+        input_filter: InputFilter optionnel; les lignes écartées ne sont pas traitées
+    
+    Yields:
+        Tuples (df_processed, df_input) pour chaque bloc
+    """
+    for chunk in iter_input_file(file, chunksize, input_filter):
+        yield process_time_entries(chunk, schedules), chunk
+
+# Fonction pour obtenir la plage de dates du titre du rapport
+def get_date_range(dates):
+    """
+    Calculer la plage de dates (JJ/MM/AAAA) affichée dans le titre du rapport.
+    
+    Args:
+        dates: Série de dates au format "JJ/MM/AAAA"
+    
+    Returns:
+        Tuple (start_date, end_date) de chaînes "JJ/MM/AAAA"
+    """
+    parsed = pd.to_datetime(dates, format='%d/%m/%Y', errors='coerce').dropna()
+    if parsed.empty:
+        # Repli si l'analyse de date échoue
+        return "01/01/2025", "31/12/2025"
+    return parsed.min().strftime('%d/%m/%Y'), parsed.max().strftime('%d/%m/%Y')
+
+# Fonction pour obtenir la plage de dates des fichiers d'entrée sans les charger entièrement
+def scan_date_range(files, chunksize=CHUNK_SIZE, input_filter=None):
+    """
+    Parcourir la colonne Date des fichiers d'entrée bloc par bloc pour obtenir la plage de dates.
+    
+    Seule la colonne Date (et les colonnes du filtre) est convertie: les autres colonnes
+    ne sont analysées que lors du traitement. Les objets fichier sont rembobinés à la fin
+    pour pouvoir être relus.
+    
+    Args:
+        files: Chemin ou objet fichier (CSV ou export Parquet), ou liste de fichiers
+        chunksize: Nombre de lignes par bloc
+        input_filter: InputFilter optionnel; seules les dates des lignes retenues comptent
+    
+    Returns:
+        Tuple (start_date, end_date) de chaînes "JJ/MM/AAAA"
+    """
+    # Seules les dates distinctes sont conservées d'un bloc à l'autre
+    valid_dates = set()
+    for file in as_file_list(files):
+        if is_columnar_file(file) and input_filter:
+            for chunk in iter_columnar(file, chunksize, input_filter):
+                dates = chunk['Date'].dropna()
+                if not dates.empty:
+                    valid_dates.update(d.strftime('%d/%m/%Y') for d in (dates.min(), dates.max()))
+        elif is_columnar_file(file):
+            # La colonne Date d'un export colonne est lue seule, déjà typée
+            dates = pd.to_datetime(pq.read_table(file, columns=['Date']).column('Date').to_pandas()).dropna()
+            if not dates.empty:
+                valid_dates.update(d.strftime('%d/%m/%Y') for d in (dates.min(), dates.max()))
+        else:
+            columns = ['Date'] + [column for column in (input_filter.columns if input_filter else []) if column != 'Date']
+            for chunk in iter_input_file(file, chunksize, input_filter, columns):
+                valid_dates.update(d for d in pd.unique(chunk['Date']) if is_valid_date(d))
+        if hasattr(file, 'seek'):
+            file.seek(0)
+    return get_date_range(pd.Series(sorted(valid_dates), dtype=object))
+
+# Fonction pour accepter un fichier unique ou une liste de fichiers
+def as_file_list(files):
+    if isinstance(files, (list, tuple)):
+        return list(files)
+    return [files]
+
+# Schéma Parquet de l'export colonne (mêmes colonnes et types que process_time_entries)
+COLUMNAR_SCHEMA = pa.schema(
+    [(column, pa.dictionary(pa.int32(), pa.string())) for column in CATEGORY_COLUMNS]
+    + [('Date', pa.date32())]
+    + [(column, pa.int16()) for column in MINUTE_COLUMNS]
+    + [('Observations', pa.dictionary(pa.int32(), pa.string()))]
+)
+
+# Signature des fichiers Parquet (premiers octets)
+PARQUET_MAGIC = b'PAR1'
+
+# Fonction pour remettre les colonnes relues d'un export colonne dans les types du traitement
+def from_columnar(typed):
+    """
+    Convertir un DataFrame relu d'un export colonne (dates datetime.date, observations
+    en catégories) dans les types de PROCESSED_DTYPES.
+    """
+    df = typed[PROCESSED_COLUMNS].copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Observations'] = df['Observations'].astype(object).fillna('')
+    return df.astype(PROCESSED_DTYPES)
+
+# Fonction pour construire la table Arrow d'un bloc de résultats
+def columnar_table(df):
+    return pa.Table.from_pandas(df[PROCESSED_COLUMNS], schema=COLUMNAR_SCHEMA, preserve_index=False)
+
+# Fonction pour écrire le résultat du traitement dans un fichier Parquet
+def write_columnar(df, target):
+    """
+    Écrire le résultat de process_time_entries au format Parquet typé.
+    
+    Args:
+        df: DataFrame produit par process_time_entries
+        target: Chemin ou objet fichier binaire de destination
+    """
+    pq.write_table(columnar_table(df), target, compression='zstd')
+
+# Fonction pour obtenir l'export Parquet du résultat sous forme d'octets
+def columnar_bytes(df):
+    output = io.BytesIO()
+    write_columnar(df, output)
+    return output.getvalue()
+
+# Fonction pour écrire les blocs traités dans un fichier Parquet au fil de leur passage
+def write_columnar_chunks(chunks, target):
+    """
+    Écrire chaque bloc traité dans un fichier Parquet (un groupe de lignes par bloc)
+    puis le transmettre inchangé, pour produire l'export colonne en mode streaming.
+    
+    Args:
+        chunks: Itérable de tuples (df_processed, df_input)
+        target: Chemin ou objet fichier binaire de destination
+    
+    Yields:
+        Les tuples (df_processed, df_input) reçus
+    """
+    with pq.ParquetWriter(target, COLUMNAR_SCHEMA, compression='zstd') as writer:
+        for df_chunk, input_chunk in chunks:
+            writer.write_table(columnar_table(df_chunk))
+            yield df_chunk, input_chunk
+
+# Fonction pour reconnaître un export colonne (Parquet) d'après ses premiers octets
+def is_columnar_file(file):
+    return detect_file_kind(file) == 'parquet'
+
+# Fonction pour lire un export colonne bloc par bloc
+def iter_columnar(file, chunksize=CHUNK_SIZE, input_filter=None):
+    """
+    Lire un export colonne (Parquet) bloc par bloc.
+    
+    Args:
+        file: Chemin ou objet fichier du Parquet
+        chunksize: Nombre de lignes par bloc
+        input_filter: InputFilter optionnel; seules les lignes retenues sont transmises
+    
+    Yields:
+        DataFrames typés comme ceux de process_time_entries
+    
+    Raises:
+        InputFormatError: Si le fichier ne contient pas les colonnes du traitement
+    """
+    parquet_file = pq.ParquetFile(file)
+    missing = [column for column in PROCESSED_COLUMNS if column not in parquet_file.schema_arrow.names]
+    if missing:
+        raise InputFormatError(f"Colonnes manquantes dans le fichier Parquet: {', '.join(missing)}")
+    chunks = (from_columnar(batch.to_pandas()) for batch in parquet_file.iter_batches(batch_size=chunksize, columns=PROCESSED_COLUMNS))
+    yield from filter_chunks(chunks, input_filter) if input_filter else chunks
+
+# Fonction pour lire un export colonne complet
+def read_columnar(file, input_filter=None):
+    chunks = list(iter_columnar(file, input_filter=input_filter))
+    if not chunks:
+        return empty_processed()
+    return pd.concat(chunks, ignore_index=True).astype(PROCESSED_DTYPES)
+
+# Fonction pour reconstituer les colonnes d'entrée à partir de résultats relus
+def columnar_input_view(df):
+    """
+    Présenter des résultats relus d'un export colonne avec les colonnes d'entrée.
+    
+    Les pointages d'origine ne font pas partie de l'export: la colonne Pointages
+    contient les heures retenues (entrée, pause, sortie), vide pour les absences.
+    
+    Args:
+        df: DataFrame produit par process_time_entries
+    
+    Returns:
+        DataFrame texte avec les colonnes INPUT_COLUMNS
+    """
+    absent = df['Observations'].str.contains('Absent', regex=False).to_numpy()
+    text = format_processed(df)
+    punches = text[['Entrée', 'Début Pause', 'Fin Pause', 'Sortie']].to_numpy(dtype=object)
+    pointages = [' '.join(p for p in row if p) for row in punches]
+    return pd.DataFrame({
+        'Matricule': text['Matricule'].to_numpy(),
+        'Nom': text['Nom'].to_numpy(),
+        'Départment': text['Départment'].to_numpy(),
+        'Date': text['Date'].to_numpy(),
+        'Pointages': np.where(absent, '', np.array(pointages, dtype=object))
+    }, columns=INPUT_COLUMNS)
+
+# Fonction pour lire et traiter un fichier d'entrée (CSV ou export colonne) bloc par bloc
+def iter_processed_chunks(file, chunksize=CHUNK_SIZE, metrics=None, schedules=None, input_filter=None):
+    metrics = metrics or PipelineMetrics()
+    if is_columnar_file(file):
+        for df_chunk in metrics.timed('Analyse', iter_columnar(file, chunksize, input_filter)):
+            yield df_chunk, columnar_input_view(df_chunk)
+    else:
+        for chunk in metrics.timed('Analyse', iter_input_file(file, chunksize, input_filter)):
+            with metrics.stage('Calcul', len(chunk)):
+                df_chunk = process_time_entries(chunk, schedules)
+            yield df_chunk, chunk
+
+# Noms des styles du rapport
+STYLE_TITLE = "Titre rapport"
+STYLE_HEADER = "En-tête rapport"
+STYLE_INPUT_HEADER = "En-tête données originales"
+STYLE_CELL = "Cellule"
+STYLE_CELL_RED = "Cellule rouge"
+STYLE_RECHECK = "Cellule à vérifier"
+STYLE_RECHECK_RED = "Cellule à vérifier rouge"
+
+# Fonction pour enregistrer les styles nommés partagés par toutes les cellules du rapport
+def register_report_styles(wb):
+    """
+    Enregistrer dans le classeur les styles nommés utilisés par le rapport.
+    
+    Chaque cellule référence un style partagé au lieu de recevoir ses propres
+    objets bordure, alignement et police.
+    
+    Args:
+        wb: Classeur openpyxl
+    """
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    center_alignment = Alignment(horizontal='center', vertical='center')
+    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    subheader_fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")
+    recheck_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")  # Jaune clair pour vérification
+    
+    styles = [
+        NamedStyle(name=STYLE_TITLE, font=Font(bold=True), alignment=center_alignment),
+        NamedStyle(name=STYLE_HEADER, fill=subheader_fill, border=thin_border, alignment=center_alignment, font=Font(bold=True)),
+        NamedStyle(name=STYLE_INPUT_HEADER, fill=header_fill, border=thin_border, alignment=center_alignment, font=Font(bold=True)),
+        NamedStyle(name=STYLE_CELL, border=thin_border, alignment=center_alignment),
+        NamedStyle(name=STYLE_CELL_RED, border=thin_border, alignment=center_alignment, font=Font(color="FF0000")),
+        NamedStyle(name=STYLE_RECHECK, fill=recheck_fill, border=thin_border, alignment=center_alignment),
+        NamedStyle(name=STYLE_RECHECK_RED, fill=recheck_fill, border=thin_border, alignment=center_alignment, font=Font(color="FF0000")),
+    ]
+    for style in styles:
+        wb.add_named_style(style)
+
+# Fonction pour créer une cellule stylée en mode écriture seule
+def styled_cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+# Fonction pour ajouter les règles de mise en forme conditionnelle du rapport
+def add_report_conditional_formatting(ws, first_row, last_row):
+    """
+    Exprimer la mise en forme des lignes de données sous forme de règles conditionnelles.
+    
+    Les règles couvrent des plages entières: leur coût ne dépend pas du nombre de lignes.
+    
+    Args:
+        ws: Feuille "Etat de pointage"
+        first_row: Première ligne de données
+        last_row: Dernière ligne de données
+    """
+    recheck_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+    red_font = Font(color="FF0000")
+    
+    # Mettre en évidence toute la ligne si les observations contiennent "À VÉRIFIER"
+    ws.conditional_formatting.add(
+        f"A{first_row}:R{last_row}",
+        FormulaRule(formula=[f'ISNUMBER(FIND("À VÉRIFIER",$R{first_row}))'], fill=recheck_fill)
+    )
+    
+    # Colorer la colonne H. Tr en rouge si elle est inférieure à HL
+    ws.conditional_formatting.add(
+        f"K{first_row}:K{last_row}",
+        FormulaRule(formula=[f'AND($K{first_row}<>"",TIMEVALUE($K{first_row})<TIMEVALUE($L{first_row}))'], font=red_font)
+    )
+    
+    # Colorer la colonne Heures perdues en rouge
+    ws.conditional_formatting.add(
+        f"M{first_row}:M{last_row}",
+        FormulaRule(formula=[f'$M{first_row}<>""'], font=red_font)
+    )
+    
+    add_border_formatting(ws, f"A{first_row}:R{last_row}")
+
+# Fonction pour ajouter des bordures fines à une plage par mise en forme conditionnelle
+def add_border_formatting(ws, cell_range):
+    thin_side = Side(style='thin')
+    thin_border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
+    ws.conditional_formatting.add(cell_range, FormulaRule(formula=['TRUE'], border=thin_border))
+
+# Fonction pour créer un fichier Excel stylisé
+def create_styled_excel(df, df_input, start_date, end_date, conditional_formatting=False, initial_totals=None):
+    return write_styled_excel([(df, df_input)], start_date, end_date, conditional_formatting, initial_totals)
+
+# Fonction pour écrire le rapport Excel stylisé à partir de blocs de données
+def write_styled_excel(chunks, start_date, end_date, conditional_formatting=False, initial_totals=None, summary=None, output=None):
+    """
+    Écrire le rapport Excel stylisé en mode streaming (write_only).
+    
+    Les blocs sont consommés un par un et chaque ligne est écrite une seule fois
+    puis libérée: ni les DataFrames complets ni les cellules ne restent en mémoire.
+    Les cumuls par employé sont reportés d'un bloc à l'autre; un bloc dont les cumuls
+    sont déjà calculés (add_running_totals) est écrit tel quel.
+    
+    Args:
+        chunks: Itérable de tuples (df_processed, df_input)
+        start_date: Date de début affichée dans le titre
+        end_date: Date de fin affichée dans le titre
+        conditional_formatting: Si True, les données sont écrites sans style et la mise
+            en évidence, le rouge et les bordures sont exprimés par des règles de mise en
+            forme conditionnelle (fichier plus léger, coût constant)
+        initial_totals: Dictionnaire optionnel {matricule: (minutes_hp, minutes_hs)} des
+            cumuls antérieurs à reprendre (traitement incrémental)
+        summary: SummaryAccumulator optionnel, alimenté avec les lignes écrites; la feuille
+            "Synthèse" en est tirée et il reste consultable après l'écriture
+        output: Objet fichier binaire de destination (io.BytesIO par défaut)
+    
+    Returns:
+        output, rembobiné, contenant le classeur enregistré
+    """
+    summary = summary if summary is not None else SummaryAccumulator()
+    
+    # Créer un classeur en mode écriture seule avec les styles nommés partagés
+    wb = Workbook(write_only=True)
+    register_report_styles(wb)
+    ws = wb.create_sheet(title="Etat de pointage")
+    
+    # Créer une deuxième feuille pour les données originales
+    ws2 = wb.create_sheet(title="Données Originales")
+    
+    # Créer une troisième feuille pour la synthèse par employé et par département (écrite à la fin)
+    ws3 = wb.create_sheet(title="Synthèse")
+    
+    headers = [
+        'Matricule', 'Prénom/Nom', 'Dept', 'Date', 'Entrée', 'Sortie', 
+        'Début Pause', 'Fin Pause', 'Temps de pause', 'H.P', 'H. Tr', 'HL',
+        'Heures perdues', 'Heures supp', 'Cumul HP', 'Cumul HS', 'TOTAL HP', 'Observations'
+    ]
+    
+    # Les largeurs de colonne doivent être définies avant d'écrire les lignes
+    for col_idx in range(1, len(headers) + 1):
+        col_letter = get_column_letter(col_idx)
+        ws.column_dimensions[col_letter].width = 15
+    
+    # Rendre la colonne Observations plus large
+    ws.column_dimensions[get_column_letter(len(headers))].width = 40
+    
+    # Ajouter la ligne de titre
+    ws.merged_cells.add('A1:N1')
+    ws.append([styled_cell(ws, f"Du {start_date} AU {end_date}", STYLE_TITLE)])
+    ws.append([])
+    
+    # Ajouter la ligne d'en-tête
+    ws.append([styled_cell(ws, header, STYLE_HEADER) for header in headers])
+    
+    # Ajouter les lignes de données
+    first_row = 4
+    row_count = 0
+    input_row_count = 0
+    input_headers = None
+    # Cumuls par employé reportés d'un bloc à l'autre
+    carry = dict(initial_totals or {})
+    
+    for df, df_input in chunks:
+        # Ajouter le titre et les en-têtes de la deuxième feuille à partir du premier bloc
+        if input_headers is None:
+            input_headers = list(df_input.columns)
+            write_input_sheet_header(ws2, input_headers)
+        
+        # Précalculer les cumuls et les indicateurs de mise en forme pour tout le bloc
+        report = df if set(CUMULATIVE_COLUMNS).issubset(df.columns) else add_running_totals(df, carry)
+        summary.add(report)
+        needs_recheck = report['Observations'].astype(str).str.contains('À VÉRIFIER', regex=False).to_numpy()
+        h_tr_minutes = minute_values(report['H. Tr'])
+        h_l_minutes = minute_values(report['HL'])
+        red_h_tr = (h_tr_minutes >= 0) & (h_l_minutes >= 0) & (h_tr_minutes < h_l_minutes)
+        red_lost = report['Heures perdues'].notna().to_numpy()
+        
+        # Les dates et durées ne sont formatées en texte qu'au moment de l'écriture
+        rows = format_processed(report)[REPORT_COLUMNS].itertuples(index=False, name=None)
+        for data, recheck, red_h_tr_cell, red_lost_cell in zip(rows, needs_recheck, red_h_tr, red_lost):
+            row_count += 1
+            
+            # Les règles de mise en forme conditionnelle s'appliquent à toute la plage à la fin
+            if conditional_formatting:
+                ws.append(data)
+                continue
+            
+            # Mettre en évidence toute la ligne si elle nécessite une vérification
+            style = STYLE_RECHECK if recheck else STYLE_CELL
+            red_style = STYLE_RECHECK_RED if recheck else STYLE_CELL_RED
+            cells = [styled_cell(ws, value, style) for value in data]
+            
+            # Colorer la colonne H. Tr en rouge si elle est inférieure à HL
+            if red_h_tr_cell:
+                cells[10].style = red_style
+            
+            # Colorer la colonne Heures perdues en rouge
+            if red_lost_cell:
+                cells[12].style = red_style
+            
+            ws.append(cells)
+        
+        # Ajouter des lignes de données à la deuxième feuille
+        for row in df_input.itertuples(index=False):
+            if conditional_formatting:
+                ws2.append(row)
+            else:
+                ws2.append([styled_cell(ws2, value, STYLE_CELL) for value in row])
+            input_row_count += 1
+    
+    if input_headers is None:
+        input_headers = []
+        write_input_sheet_header(ws2, input_headers)
+    
+    # Ajouter les règles conditionnelles (écrites à la fin de chaque feuille)
+    if conditional_formatting:
+        if row_count:
+            add_report_conditional_formatting(ws, first_row, first_row + row_count - 1)
+        if input_row_count and input_headers:
+            last_col_letter = get_column_letter(len(input_headers))
+            add_border_formatting(ws2, f"A{first_row}:{last_col_letter}{first_row + input_row_count - 1}")
+    
+    write_summary_sheet(ws3, summary.result(), start_date, end_date)
+    
+    # Enregistrer le classeur (en mémoire par défaut)
+    output = output if output is not None else io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    
+    return output
+
+# Fonction pour écrire le titre et les en-têtes de la feuille des données originales
+def write_input_sheet_header(ws2, input_headers):
+    # Ajuster automatiquement les largeurs de colonne dans la deuxième feuille
+    for col_idx in range(1, len(input_headers) + 1):
+        col_letter = get_column_letter(col_idx)
+        ws2.column_dimensions[col_letter].width = 20
+    
+    # Ajouter un titre à la deuxième feuille
+    ws2.merged_cells.add('A1:E1')
+    ws2.append([styled_cell(ws2, "Données d'Entrée Originales", STYLE_TITLE)])
+    ws2.append([])
+    
+    # Ajouter des en-têtes à la deuxième feuille
+    ws2.append([styled_cell(ws2, header, STYLE_INPUT_HEADER) for header in input_headers])
+
+# Nombre de lignes du rapport écrites par tranche (progression de l'écriture)
+WRITE_SLICE_ROWS = 5000
+
+# Fonction pour découper le rapport en tranches d'écriture, cumuls calculés sur l'ensemble
+def iter_report_slices(df, df_input, initial_totals=None, size=WRITE_SLICE_ROWS):
+    """
+    Yields:
+        Tuples (tranche du rapport avec ses cumuls, tranche des données d'entrée) pour
+        write_styled_excel; le classeur obtenu est identique à create_styled_excel
+    """
+    report = add_running_totals(df, dict(initial_totals or {}))
+    for start in range(0, max(len(report), len(df_input), 1), size):
+        yield report.iloc[start:start + size], df_input.iloc[start:start + size]
+
+# Colonnes selon lesquelles le rapport peut être scindé en plusieurs classeurs
+SPLIT_COLUMNS = ['Départment', 'Matricule']
+
+# Fonction pour construire un nom de fichier unique à partir de la valeur d'un groupe
+def split_file_name(value, used_names):
+    stem = re.sub(r'[^\w-]+', '_', str(value)).strip('_') or 'sans_nom'
+    name = f"Etat_de_pointage_{stem}.xlsx"
+    suffix = 2
+    while name in used_names:
+        name = f"Etat_de_pointage_{stem}_{suffix}.xlsx"
+        suffix += 1
+    used_names.add(name)
+    return name
+
+# Fonction exécutée dans un processus de travail pour écrire le classeur d'un groupe
+def write_report_part(df, df_input, start_date, end_date, conditional_formatting=False):
+    return create_styled_excel(df, df_input, start_date, end_date, conditional_formatting).getvalue()
+
+# Fonction pour créer un classeur par département ou par employé, regroupés dans une archive zip
+def create_split_reports(df, df_input, start_date, end_date, split_by='Départment', conditional_formatting=False, initial_totals=None, workers=None, output=None):
+    """
+    Scinder le rapport en un classeur par valeur de split_by, écrits en parallèle.
+    
+    Chaque classeur a la même forme que le rapport complet (mêmes feuilles, même titre).
+    Les cumuls sont calculés une fois sur l'ensemble des lignes avant le découpage: ils
+    sont identiques à ceux du rapport complet, y compris pour un employé ayant changé
+    de département sur la période.
+    
+    Args:
+        df: DataFrame produit par process_time_entries
+        df_input: DataFrame d'entrée correspondant
+        start_date: Date de début affichée dans les titres
+        end_date: Date de fin affichée dans les titres
+        split_by: Colonne de regroupement (voir SPLIT_COLUMNS)
+        conditional_formatting: Voir write_styled_excel
+        initial_totals: Dictionnaire optionnel {matricule: (minutes_hp, minutes_hs)} des
+            cumuls antérieurs à reprendre (traitement incrémental)
+        workers: Nombre de processus (défaut: nombre de cœurs); 1 pour écrire dans le processus courant
+        output: Objet fichier binaire de destination (io.BytesIO par défaut)
+    
+    Returns:
+        output, rembobiné, contenant l'archive zip des classeurs et de index.csv (fichier,
+        groupe, nombre de lignes, lignes à vérifier et période couverte par chaque classeur)
+    
+    Raises:
+        ValueError: Si split_by n'est pas une colonne de SPLIT_COLUMNS
+    """
+    if split_by not in SPLIT_COLUMNS:
+        raise ValueError(f"Regroupement inconnu: {split_by} (attendu: {', '.join(SPLIT_COLUMNS)})")
+    
+    # Cumuls calculés sur toutes les lignes (triées par Matricule puis Date)
+    df = add_running_totals(df, dict(initial_totals or {}))
+    
+    # Positions des lignes de chaque groupe, y compris les groupes dont toutes les dates sont invalides
+    groups = df.groupby(df[split_by].astype(str).to_numpy(), sort=False).indices
+    input_groups = df_input.groupby(df_input[split_by].astype(str).to_numpy(), sort=False).indices
+    no_rows = np.array([], dtype=np.int64)
+    
+    used_names = set()
+    index_rows = []
+    values = sorted(set(groups) | set(input_groups))
+    
+    # Les classeurs sont indépendants: chacun est écrit par un processus de travail, puis
+    # ajouté à l'archive dans l'ordre des groupes. Un groupe n'est découpé qu'au moment
+    # d'être soumis, et au plus `workers` classeurs sont en cours d'écriture ou en attente
+    # d'être archivés
+    output = output if output is not None else io.BytesIO()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(values)))
+    with ExitStack() as stack:
+        executor = None
+        if workers > 1:
+            # forkserver ou spawn plutôt que fork: l'appelant peut avoir plusieurs fils d'exécution (serveur Streamlit)
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method)))
+        
+        # Les classeurs .xlsx sont déjà compressés: ils sont stockés tels quels dans l'archive
+        with zipfile.ZipFile(output, 'w') as archive:
+            pending = deque()
+            
+            def archive_oldest():
+                name, workbook = pending.popleft()
+                archive.writestr(name, workbook.result() if executor else workbook, compress_type=zipfile.ZIP_STORED)
+            
+            for value in values:
+                part = df.iloc[groups.get(value, no_rows)]
+                name = split_file_name(value, used_names)
+                args = (part, df_input.iloc[input_groups.get(value, no_rows)], start_date, end_date, conditional_formatting)
+                pending.append((name, executor.submit(write_report_part, *args) if executor else write_report_part(*args)))
+                
+                dates = part['Date'].dropna()
+                index_rows.append({
+                    'Fichier': name,
+                    split_by: value,
+                    **({'Nom': ', '.join(part['Nom'].astype(str).unique())} if split_by == 'Matricule' else {}),
+                    'Lignes': len(part),
+                    'Lignes à vérifier': int(part['Observations'].str.contains('À VÉRIFIER', na=False).sum()),
+                    'Première date': dates.min().strftime('%d/%m/%Y') if len(dates) else '',
+                    'Dernière date': dates.max().strftime('%d/%m/%Y') if len(dates) else ''
+                })
+                del part, args
+                
+                # Archiver le plus ancien classeur dès que `workers` sont en cours
+                while len(pending) >= workers:
+                    archive_oldest()
+            while pending:
+                archive_oldest()
+            
+            index = pd.DataFrame(index_rows, columns=list(index_rows[0]) if index_rows else ['Fichier', split_by])
+            archive.writestr('index.csv', index.to_csv(sep=';', index=False).encode('utf-8-sig'), compress_type=zipfile.ZIP_DEFLATED)
+    output.seek(0)
+    
+    return output
+
+# Fonction pour écrire la feuille de synthèse (un tableau par employé, puis un par département)
+def write_summary_sheet(ws3, summary, start_date, end_date):
+    ws3.column_dimensions['A'].width = 15
+    ws3.column_dimensions['B'].width = 25
+    ws3.column_dimensions['C'].width = 20
+    for col_idx in range(4, 4 + len(SUMMARY_COLUMNS)):
+        ws3.column_dimensions[get_column_letter(col_idx)].width = 18
+    
+    ws3.merged_cells.add('A1:J1')
+    ws3.append([styled_cell(ws3, f"Synthèse du {start_date} AU {end_date}", STYLE_TITLE)])
+    
+    tables = [
+        ("Par employé", ['Matricule', 'Prénom/Nom', 'Dept'], format_summary(summary['Matricule'])),
+        ("Par département", ['Dept', 'Employés'], format_summary(summary['Départment']))
+    ]
+    for title, key_headers, table in tables:
+        ws3.append([])
+        ws3.append([styled_cell(ws3, title, STYLE_INPUT_HEADER)])
+        ws3.append([styled_cell(ws3, header, STYLE_HEADER) for header in key_headers + SUMMARY_COLUMNS])
+        for row in table.itertuples(index=False, name=None):
+            ws3.append([styled_cell(ws3, value, STYLE_CELL) for value in row])
+
+# Taille au-delà de laquelle un fichier produit passe de la mémoire au disque (modifiable par la variable d'environnement POINTAGE_SPOOL_MO)
+SPOOL_MAX_BYTES = int(os.environ.get('POINTAGE_SPOOL_MO', '16')) * 1024 * 1024
+
+class SpooledOutput:
+    """
+    Fichier produit par le traitement (rapport, archive zip, export Parquet).
+    
+    Le contenu reste en mémoire jusqu'à max_size octets, puis passe dans un fichier
+    temporaire sur disque, supprimé à la fermeture ou lorsque l'objet est libéré.
+    Les lectures sont protégées par un verrou: un même résultat peut être lu depuis
+    plusieurs sessions en même temps.
+    """
+    
+    def __init__(self, max_size=SPOOL_MAX_BYTES):
+        self.max_size = max_size
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        with self._lock:
+            return self.file.seek(0, io.SEEK_END)
+    
+    @property
+    def in_memory(self):
+        """True tant que le contenu n'a pas dépassé max_size (il n'est jamais tronqué)."""
+        return len(self) <= self.max_size
+    
+    def getvalue(self):
+        """Contenu complet en octets (copie en mémoire, à réserver aux petits fichiers et aux téléchargements)."""
+        with self._lock:
+            self.file.seek(0)
+            return self.file.read()
+    
+    def copy_to(self, path):
+        """Copier le contenu dans un fichier, par blocs."""
+        with self._lock, open(path, 'wb') as target:
+            self.file.seek(0)
+            shutil.copyfileobj(self.file, target)
+    
+    def close(self):
+        self.file.close()
+
+# Fonction pour lire le pic mémoire (RSS) du processus depuis son démarrage
+def peak_memory_mb():
+    if resource is None:
+        return None  # Non disponible sous Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS et en kilo-octets sous Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# Fonction pour lire la mémoire (RSS) utilisée actuellement par le processus
+def current_memory_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        # Hors Linux: pic du processus, à défaut de mémoire actuelle
+        return peak_memory_mb()
+
+# Intervalle (en secondes) entre deux relevés de la mémoire du processus pendant une étape
+MEMORY_SAMPLE_SECONDS = 0.05
+
+class MemoryBudgetError(MemoryError):
+    """Levée lorsque la mémoire utilisée par un traitement dépasse son budget."""
+
+# Fonction pour parcourir les DataFrames contenus dans des données (tuples et listes imbriqués)
+def iter_frames(data):
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        yield data
+    elif isinstance(data, (tuple, list)):
+        for item in data:
+            yield from iter_frames(item)
+
+# Mesures par étape d'une exécution du traitement
+class PipelineMetrics:
+    """
+    Durée, nombre de lignes et pic mémoire de chaque étape du traitement.
+    
+    Les étapes peuvent être imbriquées (en mode streaming, l'écriture Excel tire les
+    blocs analysés et calculés): la durée d'une étape exclut celle des étapes qu'elle
+    englobe, de sorte que la somme des durées correspond au temps total.
+    Le pic mémoire d'une étape est la hausse maximale de la mémoire du processus (RSS)
+    par rapport à son début, relevée toutes les MEMORY_SAMPLE_SECONDS par un fil
+    d'exécution dédié tant qu'une étape est en cours, et à sa fin; c'est le plus fort
+    sur ses exécutions, et celui d'une étape englobante inclut les étapes qu'elle contient.
+    
+    Les mesures peuvent être lues depuis un autre fil d'exécution pendant le traitement
+    (suivi de progression): current_stage est l'étape englobante en cours et
+    expected_rows le nombre de lignes à traiter, lorsqu'il est connu.
+    
+    La mémoire du traitement est la taille des données qu'il détient (voir hold): ses
+    DataFrames et les blocs en cours, comptés une fois chacun. Elle ne dépend pas des
+    autres traitements exécutés dans le même processus. job_peak_mb en est le maximum;
+    au-delà de memory_budget_mb, le traitement est interrompu (MemoryBudgetError).
+    """
+    
+    def __init__(self, memory_budget_mb=None):
+        self.stages = {}
+        self.expected_rows = None
+        self.memory_budget_mb = memory_budget_mb
+        self.job_mb = 0.0
+        self.job_peak_mb = None
+        self._held = {}
+        self._sizes = {}
+        self._child_seconds = []
+        self._active = []
+        self._peaks = []
+        self._peaks_lock = threading.Lock()
+        self._sampler_stop = None
+    
+    @property
+    def current_stage(self):
+        active = self._active
+        return active[0] if active else None
+    
+    def _record(self, name):
+        return self.stages.setdefault(name, {'seconds': 0.0, 'rows': 0, 'memory_mb': None, 'job_mb': None})
+    
+    @contextmanager
+    def stage(self, name, rows=0):
+        self._child_seconds.append(0.0)
+        self._active.append(name)
+        start_mb = current_memory_mb()
+        with self._peaks_lock:
+            self._peaks.append(start_mb)
+        # Relever la mémoire pendant l'étape la plus englobante (et donc pendant toutes)
+        if len(self._active) == 1 and start_mb is not None:
+            self._sampler_stop = threading.Event()
+            threading.Thread(target=self._sample_memory, args=(self._sampler_stop,), daemon=True).start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._active.pop()
+            end_mb = current_memory_mb()
+            with self._peaks_lock:
+                peak_mb = self._peaks.pop()
+            if not self._active and self._sampler_stop is not None:
+                self._sampler_stop.set()
+                self._sampler_stop = None
+            nested = self._child_seconds.pop()
+            if self._child_seconds:
+                self._child_seconds[-1] += elapsed
+            record = self._record(name)
+            record['seconds'] += elapsed - nested
+            record['rows'] += rows
+            if start_mb is not None and end_mb is not None:
+                record['memory_mb'] = max(record['memory_mb'] or 0.0, max(peak_mb, end_mb) - start_mb)
+            record['job_mb'] = max(record['job_mb'] or 0.0, self.job_mb)
+    
+    def _sample_memory(self, stop):
+        while not stop.wait(MEMORY_SAMPLE_SECONDS):
+            current = current_memory_mb()
+            with self._peaks_lock:
+                self._peaks = [max(peak, current) if peak is not None and current is not None else peak for peak in self._peaks]
+    
+    def hold(self, name, data):
+        """
+        Compter les données name du traitement (DataFrames, tuples de DataFrames) dans sa
+        mémoire, ou ne plus les compter si data est None.
+        
+        Raises:
+            MemoryBudgetError: Si la mémoire du traitement dépasse alors memory_budget_mb
+        """
+        if data is None:
+            self._held.pop(name, None)
+        else:
+            self._held[name] = data
+        
+        # La taille de chaque DataFrame est calculée une fois, tant qu'il est détenu
+        sizes = {}
+        for frame in iter_frames(list(self._held.values())):
+            key = id(frame)
+            sizes[key] = self._sizes.get(key) or (frame, float(np.sum(frame.memory_usage(deep=True))) / (1024 * 1024))
+        self._sizes = sizes
+        self.job_mb = sum(size for _, size in sizes.values())
+        self.job_peak_mb = max(self.job_peak_mb or 0.0, self.job_mb)
+        
+        if self.memory_budget_mb is not None and self.job_mb > self.memory_budget_mb:
+            raise MemoryBudgetError(
+                f"Budget mémoire dépassé: {self.job_mb:.1f} Mo de données pour {self.memory_budget_mb} Mo autorisés "
+                f"(étape {self.current_stage or name})"
+            )
+    
+    def count(self, name, rows):
+        self._record(name)['rows'] += rows
+    
+    def timed(self, name, iterable, rows=len):
+        """
+        Transmettre les éléments de iterable en comptant leur production dans l'étape name;
+        l'élément en cours est compté dans la mémoire du traitement (voir hold).
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, None)
+            self.hold(name, item)
+            if item is None:
+                return
+            self.count(name, rows(item))
+            yield item
+    
+    def summary(self):
+        """
+        Returns:
+            Liste de dictionnaires (etape, secondes, lignes, lignes_par_seconde, pic_memoire_mo,
+            memoire_traitement_mo)
+        """
+        return [
+            {
+                'etape': name,
+                'secondes': round(record['seconds'], 4),
+                'lignes': record['rows'],
+                'lignes_par_seconde': round(record['rows'] / record['seconds']) if record['rows'] and record['seconds'] > 0 else None,
+                'pic_memoire_mo': None if record['memory_mb'] is None else round(record['memory_mb'], 1),
+                'memoire_traitement_mo': None if record['job_mb'] is None else round(record['job_mb'], 1)
+            }
+            for name, record in self.stages.items()
+        ]
+
+# Fonction pour ajouter une ligne JSON au journal des diagnostics
+def append_diagnostics_log(path, entry):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+# Fonction pour extraire les lignes à vérifier au fil des blocs traités
+def collect_recheck_entries(chunks, recheck_chunks):
+    for df_chunk, input_chunk in chunks:
+        recheck_chunks.append(df_chunk[df_chunk['Observations'].str.contains('À VÉRIFIER', na=False)])
+        yield df_chunk, input_chunk
+
+# Fonction pour exécuter l'analyse, le calcul et l'export d'un ou plusieurs fichiers
+def run_pipeline(files, streaming_mode=False, conditional_formatting=False, store=None, columnar_output=False, metrics=None, split_by=None, workers=None, schedules=None, input_filter=None, keep_frames=True):
+    """
+    Analyser les fichiers d'entrée, calculer les heures et générer le rapport Excel.
+    
+    Args:
+        files: Chemin ou objet fichier du CSV, ou liste de fichiers regroupés dans un même rapport.
+            Les exports colonne (Parquet) sont relus tels quels, sans nouveau calcul
+        streaming_mode: Si True, les fichiers sont lus, traités et écrits bloc par bloc
+        conditional_formatting: Si True, le rapport utilise des règles de mise en forme conditionnelle
+        store: ResultStore optionnel; seules les lignes nouvelles ou modifiées sont alors
+            calculées et les cumuls reprennent à partir de l'historique enregistré
+        columnar_output: Si True, le résultat est aussi exporté au format Parquet typé
+        metrics: PipelineMetrics optionnel dans lequel les étapes sont mesurées
+        split_by: Si renseigné ('Départment' ou 'Matricule'), le rapport est scindé en un
+            classeur par groupe, regroupés dans une archive zip (voir create_split_reports)
+        workers: Nombre de processus d'écriture des classeurs scindés (défaut: nombre de cœurs)
+        schedules: ScheduleTable optionnel des horaires par Matricule, Départment et jour
+            (voir load_schedules); horaire par défaut sinon
+        input_filter: InputFilter optionnel (période, départements, matricules), appliqué
+            à la lecture: les lignes écartées ne sont ni calculées ni écrites
+        keep_frames: Si False, df_input et df_processed sont libérés dès la fin des étapes
+            qui les utilisent et ne figurent pas dans le résultat
+    
+    Returns:
+        Dictionnaire avec df_input, df_processed (None en mode streaming ou sans
+        keep_frames), rows (nombre de lignes calculées), recheck_entries, summary (synthèse
+        par employé et par département, voir SummaryAccumulator.result), excel_file (None
+        si le rapport est scindé), zip_file (None sauf si le rapport est scindé),
+        parquet_file (None sans columnar_output) et diagnostics (mesures par étape, voir
+        PipelineMetrics.summary). Les fichiers produits sont des SpooledOutput.
+    
+    Raises:
+        InputFormatError: Si un fichier d'entrée n'a pas le format attendu
+        ValueError: Si le traitement incrémental ou le rapport scindé est demandé en mode streaming
+        MemoryBudgetError: Si le budget mémoire des mesures (metrics) est dépassé
+    """
+    files = as_file_list(files)
+    metrics = metrics or PipelineMetrics()
+    
+    if streaming_mode and store is not None:
+        raise ValueError("Le traitement incrémental n'est pas disponible en mode streaming")
+    if streaming_mode and split_by is not None:
+        raise ValueError("Le rapport scindé n'est pas disponible en mode streaming")
+    
+    if streaming_mode:
+        # Lire, traiter et écrire le rapport bloc par bloc
+        recheck_chunks = []
+        metrics.hold('recheck_entries', recheck_chunks)
+        summary = SummaryAccumulator()
+        
+        # Une première passe légère sur la colonne Date fournit la plage de dates du titre
+        with metrics.stage('Plage de dates'):
+            start_date, end_date = scan_date_range(files, input_filter=input_filter)
+        chunks = itertools.chain.from_iterable(
+            iter_processed_chunks(file, metrics=metrics, schedules=schedules, input_filter=input_filter) for file in files
+        )
+        parquet_output = SpooledOutput() if columnar_output else None
+        if columnar_output:
+            chunks = metrics.timed('Export Parquet', write_columnar_chunks(chunks, parquet_output.file), rows=lambda item: len(item[0]))
+        
+        # La durée de l'écriture exclut l'analyse et le calcul des blocs qu'elle consomme
+        excel_output = SpooledOutput()
+        with metrics.stage('Écriture Excel'):
+            write_styled_excel(
+                metrics.timed('Écriture Excel', collect_recheck_entries(chunks, recheck_chunks), rows=lambda item: len(item[0])),
+                start_date,
+                end_date,
+                conditional_formatting,
+                summary=summary,
+                output=excel_output.file
+            )
+        
+        return {
+            'df_input': None,
+            'df_processed': None,
+            'rows': metrics.stages['Écriture Excel']['rows'],
+            'recheck_entries': pd.concat(recheck_chunks).astype(PROCESSED_DTYPES) if recheck_chunks else empty_processed(),
+            'summary': summary.result(),
+            'excel_file': excel_output,
+            'zip_file': None,
+            'parquet_file': parquet_output,
+            'diagnostics': metrics.summary()
+        }
+    
+    # Séparer les exports colonne (résultats déjà calculés) des fichiers CSV à analyser
+    columnar = [is_columnar_file(file) for file in files]
+    columnar_files = [file for file, is_columnar in zip(files, columnar) if is_columnar]
+    csv_files = [file for file, is_columnar in zip(files, columnar) if not is_columnar]
+    
+    # Analyser les fichiers d'entrée
+    with metrics.stage('Analyse'):
+        df_input = pd.concat([parse_input_csv(file, input_filter) for file in csv_files] or [pd.DataFrame(columns=INPUT_COLUMNS)], ignore_index=True)
+        metrics.hold('df_input', df_input)
+    metrics.count('Analyse', len(df_input))
+    metrics.expected_rows = len(df_input)
+    
+    # Traiter les entrées de temps (uniquement les lignes nouvelles ou modifiées si un historique est fourni)
+    with metrics.stage('Calcul', len(df_input)):
+        if store is not None:
+            df_processed = store.process(df_input, schedules)
+            initial_totals = store.totals_before(df_processed)
+        else:
+            df_processed = process_time_entries(df_input, schedules)
+            initial_totals = None
+        metrics.hold('df_processed', df_processed)
+    
+    # Ajouter les résultats relus des exports colonne
+    if columnar_files:
+        with metrics.stage('Analyse'):
+            reloaded = [read_columnar(file, input_filter) for file in columnar_files]
+        metrics.count('Analyse', sum(len(part) for part in reloaded))
+        df_processed = pd.concat([df_processed] + reloaded, ignore_index=True).astype(PROCESSED_DTYPES)
+        df_input = pd.concat([df_input] + [columnar_input_view(part) for part in reloaded], ignore_index=True)
+        del reloaded
+        metrics.expected_rows = len(df_processed)
+        metrics.hold('df_input', df_input)
+        metrics.hold('df_processed', df_processed)
+    
+    # Obtenir la plage de dates pour le titre du rapport
+    start_date, end_date = get_date_range(df_processed['Date'])
+    
+    # Créer le fichier Excel stylisé (ou un classeur par groupe), écrit en mémoire puis sur disque au-delà de SPOOL_MAX_BYTES
+    excel_output = zip_output = None
+    summary = SummaryAccumulator()
+    if split_by is not None:
+        zip_output = SpooledOutput()
+        with metrics.stage('Écriture Excel', len(df_processed)):
+            create_split_reports(df_processed, df_input, start_date, end_date, split_by, conditional_formatting, initial_totals, workers, zip_output.file)
+        summary.add(df_processed)
+    else:
+        # Écriture par tranches pour suivre la progression ligne à ligne
+        excel_output = SpooledOutput()
+        with metrics.stage('Écriture Excel'):
+            write_styled_excel(
+                metrics.timed('Écriture Excel', iter_report_slices(df_processed, df_input, initial_totals), rows=lambda item: len(item[0])),
+                start_date,
+                end_date,
+                conditional_formatting,
+                summary=summary,
+                output=excel_output.file
+            )
+    
+    # Les données d'entrée ne servent qu'au rapport Excel
+    if not keep_frames:
+        df_input = None
+        metrics.hold('df_input', None)
+    recheck_entries = df_processed[df_processed['Observations'].str.contains('À VÉRIFIER', na=False)]
+    metrics.hold('recheck_entries', recheck_entries)
+    
+    parquet_output = None
+    if columnar_output:
+        parquet_output = SpooledOutput()
+        with metrics.stage('Export Parquet', len(df_processed)):
+            write_columnar(df_processed, parquet_output.file)
+    
+    rows = len(df_processed)
+    if not keep_frames:
+        df_processed = None
+        metrics.hold('df_processed', None)
+    
+    return {
+        'df_input': df_input,
+        'df_processed': df_processed,
+        'rows': rows,
+        'recheck_entries': recheck_entries,
+        'summary': summary.result(),
+        'excel_file': excel_output,
+        'zip_file': zip_output,
+        'parquet_file': parquet_output,
+        'diagnostics': metrics.summary()
+    }
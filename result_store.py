@@ -0,0 +1,211 @@
+"""
+Stockage local des résultats de pointage pour le traitement incrémental.
+
+Les lignes calculées sont conservées dans une base SQLite, indexées par
+(Matricule, Date). Lors d'un nouvel import, seules les lignes nouvelles ou
+modifiées sont recalculées, et les cumuls HP/HS reprennent à partir des
+totaux déjà enregistrés pour les dates antérieures.
+"""
+
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pointage import (
+    DEFAULT_SCHEDULE_TABLE, PROCESSED_COLUMNS, PROCESSED_DTYPES, SCHEDULE_FIELDS, empty_processed,
+    format_processed, is_valid_date, minute_values, parse_dates, parse_processed, process_time_entries
+)
+
+# Emplacement par défaut de la base (modifiable par la variable d'environnement POINTAGE_HISTORIQUE)
+DEFAULT_STORE_PATH = os.environ.get('POINTAGE_HISTORIQUE', 'pointage_historique.sqlite3')
+
+# Colonnes SQL correspondant aux colonnes produites par process_time_entries (stockées en texte)
+STORE_COLUMNS = {
+    'Matricule': 'matricule',
+    'Nom': 'nom',
+    'Départment': 'departement',
+    'Date': 'date_texte',
+    'Entrée': 'entree',
+    'Sortie': 'sortie',
+    'Début Pause': 'debut_pause',
+    'Fin Pause': 'fin_pause',
+    'Temps de pause': 'temps_pause',
+    'H.P': 'h_p',
+    'H. Tr': 'h_tr',
+    'HL': 'h_l',
+    'Heures perdues': 'heures_perdues',
+    'Heures supp': 'heures_supp',
+    'Observations': 'observations'
+}
+
+# Colonnes d'entrée dont dépend le résultat d'une ligne
+SIGNATURE_COLUMNS = ['Nom', 'Départment', 'Date', 'Pointages']
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS results (
+    date TEXT NOT NULL,
+    signature INTEGER NOT NULL,
+    lost_minutes INTEGER NOT NULL,
+    extra_minutes INTEGER NOT NULL,
+    {', '.join(f'{name} TEXT' for name in STORE_COLUMNS.values())},
+    PRIMARY KEY (matricule, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+"""
+
+# Fonction pour convertir les dates JJ/MM/AAAA en dates ISO (AAAA-MM-JJ)
+def to_iso_dates(dates):
+    """
+    Convertir une série de dates "JJ/MM/AAAA" en chaînes ISO triables.
+    
+    Chaque date distincte n'est analysée qu'une fois; les dates invalides donnent None.
+    """
+    mapping = {
+        d: datetime.strptime(d, '%d/%m/%Y').strftime('%Y-%m-%d') if is_valid_date(d) else None
+        for d in pd.unique(dates)
+    }
+    return dates.map(mapping)
+
+# Fonction pour calculer l'empreinte des colonnes d'entrée et de l'horaire de chaque ligne
+def row_signatures(df, schedules=None):
+    """
+    Une modification de l'horaire applicable (voir ScheduleTable) change l'empreinte,
+    de sorte que les lignes concernées sont recalculées.
+    """
+    schedules = schedules or DEFAULT_SCHEDULE_TABLE
+    schedule_ids = schedules.lookup(df, parse_dates(df['Date']))
+    columns = df[SIGNATURE_COLUMNS].astype(str).reset_index(drop=True)
+    for field in SCHEDULE_FIELDS:
+        columns[field] = schedules.values[field][schedule_ids]
+    return pd.util.hash_pandas_object(columns, index=False).to_numpy().view(np.int64)
+
+class ResultStore:
+    """
+    Base SQLite des résultats calculés, indexée par (Matricule, Date).
+    
+    Seul le chemin est conservé: une connexion est ouverte pour chaque opération,
+    ce qui permet d'utiliser le même objet depuis plusieurs sessions ou processus.
+    """
+    
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = str(path)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+    
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+    
+    def revision(self):
+        """Numéro incrémenté à chaque écriture (utilisé dans les clés de cache)."""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+    
+    def process(self, df_input, schedules=None):
+        """
+        Calculer les entrées de temps en ne traitant que les lignes nouvelles ou modifiées.
+        
+        Args:
+            df_input: DataFrame d'entrée (colonnes Matricule, Nom, Départment, Date, Pointages)
+            schedules: ScheduleTable optionnel; une ligne dont l'horaire a changé est recalculée
+        
+        Returns:
+            DataFrame identique à celui de process_time_entries(df_input, schedules)
+        """
+        # Ignorer les lignes avec des dates invalides, comme process_time_entries
+        iso_dates = to_iso_dates(df_input['Date'])
+        df_input = df_input[iso_dates.notna()].reset_index(drop=True)
+        iso_dates = iso_dates[iso_dates.notna()].reset_index(drop=True)
+        if df_input.empty:
+            return empty_processed()
+        
+        keys = pd.DataFrame({
+            'matricule': df_input['Matricule'].astype(str).to_numpy(),
+            'date': iso_dates.to_numpy(),
+            'signature': row_signatures(df_input, schedules)
+        })
+        
+        with closing(self._connect()) as conn, conn:
+            stored = self._fetch(conn, keys[['matricule', 'date']].drop_duplicates())
+            stored['signature'] = stored['signature'].astype('Int64')
+            merged = keys.merge(stored, on=['matricule', 'date'], how='left', suffixes=('', '_stored'))
+            fresh = (merged['signature_stored'] == merged['signature']).fillna(False).to_numpy(dtype=bool)
+            
+            # Recalculer uniquement les lignes nouvelles ou modifiées
+            computed = process_time_entries(df_input[~fresh], schedules)
+            if not computed.empty:
+                self._save(conn, computed, keys[~fresh])
+        
+        reused = merged.loc[fresh, list(STORE_COLUMNS.values())]
+        reused.columns = list(STORE_COLUMNS)
+        
+        # Reconstituer le résultat dans l'ordre des lignes d'entrée
+        result = pd.concat([
+            parse_processed(reused).set_axis(np.flatnonzero(fresh)),
+            computed.set_axis(np.flatnonzero(~fresh))
+        ]).sort_index()
+        return result.reset_index(drop=True)[PROCESSED_COLUMNS].astype(PROCESSED_DTYPES)
+    
+    def totals_before(self, df_processed):
+        """
+        Totaux enregistrés des heures perdues et supplémentaires avant la période importée.
+        
+        Args:
+            df_processed: DataFrame produit par process ou process_time_entries
+        
+        Returns:
+            Dictionnaire {matricule: (minutes_hp, minutes_hs)} utilisable comme report initial des cumuls
+        """
+        if df_processed.empty:
+            return {}
+        bounds = pd.DataFrame({
+            'matricule': df_processed['Matricule'].astype(str).to_numpy(),
+            'date': pd.to_datetime(df_processed['Date']).dt.strftime('%Y-%m-%d').to_numpy()
+        }).groupby('matricule', as_index=False)['date'].min()
+        
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TEMP TABLE bounds (matricule TEXT PRIMARY KEY, first_date TEXT)")
+            conn.executemany("INSERT INTO bounds VALUES (?, ?)", bounds.itertuples(index=False, name=None))
+            rows = conn.execute("""
+                SELECT r.matricule, SUM(r.lost_minutes), SUM(r.extra_minutes)
+                FROM results r JOIN bounds b ON r.matricule = b.matricule AND r.date < b.first_date
+                GROUP BY r.matricule
+            """).fetchall()
+        return {matricule: (int(hp), int(hs)) for matricule, hp, hs in rows}
+    
+    def _fetch(self, conn, keys):
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (matricule TEXT, date TEXT, PRIMARY KEY (matricule, date))")
+        conn.execute("DELETE FROM lookup")
+        conn.executemany("INSERT INTO lookup VALUES (?, ?)", keys.itertuples(index=False, name=None))
+        columns = ', '.join(f'r.{name}' for name in STORE_COLUMNS.values() if name != 'matricule')
+        return pd.read_sql_query(
+            f"SELECT l.matricule, l.date, r.signature, {columns} "
+            "FROM lookup l JOIN results r ON r.matricule = l.matricule AND r.date = l.date",
+            conn
+        )
+    
+    def _save(self, conn, computed, keys):
+        rows = pd.DataFrame({
+            'date': keys['date'].to_numpy(),
+            'signature': keys['signature'].to_numpy(),
+            'lost_minutes': np.maximum(minute_values(computed['Heures perdues']), 0),
+            'extra_minutes': np.maximum(minute_values(computed['Heures supp']), 0)
+        })
+        text = format_processed(computed)
+        for column, name in STORE_COLUMNS.items():
+            rows[name] = text[column].astype(str).to_numpy()
+        rows['matricule'] = keys['matricule'].to_numpy()
+        
+        placeholders = ', '.join('?' for _ in rows.columns)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO results ({', '.join(rows.columns)}) VALUES ({placeholders})",
+            rows.astype(object).itertuples(index=False, name=None)
+        )
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
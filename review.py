@@ -0,0 +1,176 @@
+"""
+Vue de vérification des lignes signalées, filtrée, triée et paginée côté serveur.
+
+Les positions des lignes sont indexées une fois par Matricule, Départment, Date et
+type d'observation. Chaque requête se réduit alors à des intersections de tableaux
+de positions, et seule la page affichée est convertie en texte pour l'interface.
+"""
+
+import numpy as np
+import pandas as pd
+
+from pointage import format_duration, format_processed, minute_values
+
+# Types d'observation, reconnus par le texte ajouté par process_time_entries
+OBSERVATION_TYPES = {
+    'Pointages normalisés': 'À VÉRIFIER',
+    'Pause manquante': 'Données de pause manquantes',
+    'Erreur de calcul': 'Erreur dans les calculs de temps',
+    'Absent': 'Absent',
+    'Données irrégulières': 'Données irrégulières'
+}
+
+# Colonnes proposées pour le tri
+SORT_COLUMNS = ['Date', 'Matricule', 'Nom', 'Départment', 'H. Tr', 'Heures perdues', 'Heures supp']
+
+# Nombre de lignes par page par défaut
+DEFAULT_PAGE_SIZE = 100
+
+# Fonction pour regrouper les positions des lignes par valeur d'une colonne
+def positions_by_value(column):
+    """
+    Returns:
+        Dictionnaire {valeur: tableau trié des positions des lignes ayant cette valeur}
+    """
+    codes, uniques = pd.factorize(column)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+
+class ReviewIndex:
+    """
+    Index des lignes à vérifier pour le filtrage, le tri et la pagination.
+    
+    Les index par valeur sont construits à la création; les rangs de tri le sont à la
+    première utilisation de chaque colonne, puis conservés.
+    """
+    
+    def __init__(self, entries):
+        self.entries = entries.reset_index(drop=True)
+        self._by_value = {
+            column: positions_by_value(self.entries[column].astype(str))
+            for column in ['Matricule', 'Départment']
+        }
+        self._date_order = np.argsort(self.entries['Date'].to_numpy(), kind='stable')
+        self._sorted_dates = self.entries['Date'].to_numpy()[self._date_order]
+        observations = self.entries['Observations'].astype(str)
+        self._by_type = {
+            label: np.flatnonzero(observations.str.contains(marker, regex=False).to_numpy())
+            for label, marker in OBSERVATION_TYPES.items()
+        }
+        self._ranks = {}
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def options(self, column):
+        """Valeurs distinctes (triées) d'une colonne indexée, ou types d'observation présents."""
+        if column == 'Observations':
+            return [label for label, positions in self._by_type.items() if len(positions)]
+        return sorted(self._by_value[column])
+    
+    def date_bounds(self):
+        """Première et dernière date des lignes (None si l'index est vide)."""
+        if not len(self):
+            return None
+        return pd.Timestamp(self._sorted_dates[0]).date(), pd.Timestamp(self._sorted_dates[-1]).date()
+    
+    def query(self, matricules=None, departments=None, date_range=None, types=None, sort_by='Date', ascending=True):
+        """
+        Sélectionner et trier les lignes correspondant aux filtres.
+        
+        Args:
+            matricules: Matricules retenus (None ou vide pour tous)
+            departments: Départements retenus (None ou vide pour tous)
+            date_range: Tuple (début, fin) de dates incluses, ou None
+            types: Types d'observation retenus (voir OBSERVATION_TYPES); une ligne est
+                retenue si elle porte au moins l'un d'eux
+            sort_by: Colonne de tri (voir SORT_COLUMNS)
+            ascending: Sens du tri
+        
+        Returns:
+            Tableau des positions des lignes sélectionnées, dans l'ordre du tri
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, values in (('Matricule', matricules), ('Départment', departments)):
+            if values:
+                mask &= self._mask([self._by_value[column].get(str(v), []) for v in values])
+        if types:
+            mask &= self._mask([self._by_type[label] for label in types])
+        if date_range is not None:
+            start, end = (np.datetime64(pd.Timestamp(d), 'ns') for d in date_range)
+            lo = np.searchsorted(self._sorted_dates, start, side='left')
+            hi = np.searchsorted(self._sorted_dates, end, side='right')
+            mask &= self._mask([self._date_order[lo:hi]])
+        
+        positions = np.flatnonzero(mask)
+        ranks = self._rank(sort_by)[positions]
+        return positions[np.argsort(ranks if ascending else -ranks, kind='stable')]
+    
+    def page(self, positions, page=1, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Lignes d'une page de la sélection, au format texte d'affichage.
+        
+        Args:
+            positions: Tableau produit par query
+            page: Numéro de page (à partir de 1)
+            page_size: Nombre de lignes par page
+        """
+        start = (page - 1) * page_size
+        return format_processed(self.entries.iloc[positions[start:start + page_size]])
+    
+    def summary(self, by='Matricule', positions=None):
+        """
+        Synthèse des lignes sélectionnées par employé (Matricule) ou par département.
+        
+        Args:
+            by: 'Matricule' ou 'Départment'
+            positions: Tableau produit par query (None pour toutes les lignes)
+        
+        Returns:
+            DataFrame avec le nombre de lignes, la période et les heures perdues et
+            supplémentaires cumulées (HH:MM), trié par nombre de lignes décroissant
+        """
+        entries = self.entries if positions is None else self.entries.iloc[positions]
+        keys = [by, 'Nom'] if by == 'Matricule' else [by]
+        grouped = pd.DataFrame({
+            **{key: entries[key].astype(str).to_numpy() for key in keys},
+            'Date': entries['Date'].to_numpy(),
+            'perdues': np.maximum(minute_values(entries['Heures perdues']), 0),
+            'supp': np.maximum(minute_values(entries['Heures supp']), 0)
+        }).groupby(by, sort=False).agg(
+            **({'Nom': ('Nom', 'first')} if by == 'Matricule' else {}),
+            **{
+                'Lignes à vérifier': ('Date', 'size'),
+                'Première date': ('Date', 'min'),
+                'Dernière date': ('Date', 'max'),
+                'perdues': ('perdues', 'sum'),
+                'supp': ('supp', 'sum')
+            }
+        ).sort_values('Lignes à vérifier', ascending=False, kind='stable')
+        
+        grouped['Première date'] = grouped['Première date'].dt.strftime('%d/%m/%Y')
+        grouped['Dernière date'] = grouped['Dernière date'].dt.strftime('%d/%m/%Y')
+        grouped['Heures perdues'] = format_duration(grouped.pop('perdues'))
+        grouped['Heures supp'] = format_duration(grouped.pop('supp'))
+        return grouped.reset_index()
+    
+    def _mask(self, groups):
+        mask = np.zeros(len(self), dtype=bool)
+        for positions in groups:
+            mask[positions] = True
+        return mask
+    
+    def _rank(self, column):
+        # Rang de chaque ligne dans l'ordre de la colonne (cases vides en premier)
+        if column not in self._ranks:
+            if column == 'Date':
+                order = self._date_order
+            elif column in ('H. Tr', 'Heures perdues', 'Heures supp'):
+                order = np.argsort(minute_values(self.entries[column]), kind='stable')
+            else:
+                order = np.argsort(self.entries[column].astype(str).to_numpy(dtype=object), kind='stable')
+            ranks = np.empty(len(self), dtype=np.int64)
+            ranks[order] = np.arange(len(self))
+            self._ranks[column] = ranks
+        return self._ranks[column]